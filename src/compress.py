@@ -1,9 +1,31 @@
 import os
+import io
 import sys
+import json
+import hashlib
 import argparse
-from PIL import Image
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, features
 from pathlib import Path
 
+from place_delta import mark_consumed, pending_changes
+
+MANIFEST_NAME = ".compress_manifest.json"
+MANIFEST_VERSION = 1
+VARIANTS_MANIFEST_NAME = "variants.json"
+# Downscaling keeps at least this many source pixels per output pixel before
+# the final LANCZOS pass (see open_for_target). 0 disables the shortcut.
+DEFAULT_QUALITY_GUARD = 2.0
+# Lowest quality --target-kb may pick; --quality is the highest.
+DEFAULT_MIN_QUALITY = 30
+# Output formats for --variants: name -> (Pillow format, file extension)
+VARIANT_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "avif": ("AVIF", ".avif"),
+}
+
 def get_size_format(b, factor=1024, suffix="B"):
     """
     Scale bytes to its proper byte format
@@ -17,15 +39,182 @@ def get_size_format(b, factor=1024, suffix="B"):
         b /= factor
     return f"{b:.2f}Y{suffix}"
 
-def compress_image(file_path, max_width=1200, quality=80, create_webp=True):
+def save_atomic(img, path, format, **params):
+    """
+    Save to a temporary file and rename it over path. Besides never leaving a
+    half-written image, this replaces the directory entry instead of writing
+    into the existing file, so hard-linked copies (e.g. photo store blobs)
+    are left untouched.
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        img.save(tmp_path, format, **params)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def file_sha256(file_path):
+    """SHA-256 of a file's contents, read in 1MB chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """
+    Load the compression manifest: for every processed image (keyed by path
+    relative to the image tree) the size, mtime and content hash of the file
+    as it was left after compression, plus the parameters used.
+    """
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+def save_manifest(manifest_path, entries):
+    tmp_path = manifest_path.with_name(f".{manifest_path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": MANIFEST_VERSION, "files": entries}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_up_to_date(file_path, entry, params):
+    """
+    True if file_path was already processed with params and hasn't changed since.
+    Size and mtime are checked first; the content hash is only computed when
+    they differ (e.g. after a copy or touch), and a matching hash refreshes
+    the recorded stat so the next run is cheap again.
+    """
+    if entry is None or entry.get("params") != params:
+        return False
+    if params.get("webp") and not file_path.with_suffix('.webp').exists():
+        return False
+    stat = file_path.stat()
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if stat.st_size == entry["size"] and file_sha256(file_path) == entry["sha256"]:
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+def manifest_entry(file_path, params):
+    stat = file_path.stat()
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(file_path),
+        "params": params,
+    }
+
+def open_for_target(file_path, target_width, quality_guard=DEFAULT_QUALITY_GUARD):
+    """
+    Opens an image that is about to be downscaled to target_width.
+    For JPEGs much wider than the target, the decoder is put in draft mode so
+    it scales by 1/2, 1/4 or 1/8 while decoding (far less work and memory than
+    decoding every pixel), stopping while the image is still at least
+    quality_guard times the target size so the final resample has enough
+    detail to work with. Returns (image, original_width, original_height).
+    """
+    img = Image.open(file_path)
+    width, height = img.size
+    if quality_guard >= 1 and img.format == "JPEG" and width > target_width * quality_guard:
+        scale = target_width * quality_guard / width
+        img.draft(img.mode, (int(width * scale), int(height * scale)))
+    return img, width, height
+
+def resize_for_target(img, size, quality_guard=DEFAULT_QUALITY_GUARD):
+    """
+    LANCZOS resize that first shrinks by an integer factor with a cheap box
+    reduce whenever the image is more than quality_guard times the target size.
+    """
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=quality_guard if quality_guard >= 1 else None)
+
+def write_atomic(path, data):
+    """Write bytes to a temporary file and rename it over path."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def encode_to_budget(img, format, budget_bytes, min_quality, max_quality, hint=None, **params):
+    """
+    Finds the highest encoder quality whose output fits in budget_bytes. A
+    previously chosen quality (hint) is checked with its neighbour first: if
+    the hint fits and hint+1 doesn't (or the hint doesn't fit and hint-1
+    does), that settles it in two encodes. Otherwise the remaining range is
+    binary-searched. If even min_quality is too big, the min_quality
+    encoding is returned.
+    Returns (encoded_bytes, quality).
+    """
+    encoded = {}
+
+    def encode(q):
+        if q not in encoded:
+            buffer = io.BytesIO()
+            img.save(buffer, format, quality=q, **params)
+            encoded[q] = buffer.getvalue()
+        return encoded[q]
+
+    def fits(q):
+        return len(encode(q)) <= budget_bytes
+
+    low, high = min_quality, max_quality
+    best = None
+    if hint is not None and low <= hint <= high:
+        if fits(hint):
+            best = hint
+            if hint == high or not fits(hint + 1):
+                return encode(best), best
+            low = hint + 2
+            best = hint + 1
+        else:
+            if hint == low:
+                return encode(low), low
+            if fits(hint - 1):
+                return encode(hint - 1), hint - 1
+            high = hint - 2
+
+    while low <= high:
+        probe = (low + high) // 2
+        if fits(probe):
+            best = probe
+            low = probe + 1
+        else:
+            high = probe - 1
+
+    if best is None:
+        best = min_quality
+    return encode(best), best
+
+def compress_image(file_path, max_width=1200, quality=80, create_webp=True, quality_guard=DEFAULT_QUALITY_GUARD,
+                   target_kb=None, min_quality=DEFAULT_MIN_QUALITY, quality_hints=None):
     """
     Compresses an image file.
-    - Resizes if width > max_width
+    - Resizes if width > max_width (reduced-size JPEG decoding and a
+      reduce-then-resample pass, bounded by quality_guard)
     - Optimizes JPEG/PNG compression
     - Optionally creates a WebP version
+    - With target_kb, JPEG and WebP qualities are searched per image (between
+      min_quality and quality) to fit that budget; quality_hints holds the
+      qualities chosen on a previous run to start the search from
+
+    Returns (original_size, new_size, chosen_qualities), where
+    chosen_qualities maps "jpeg"/"webp" to the quality picked by target_kb.
     """
     try:
-        img = Image.open(file_path)
+        img, width, height = open_for_target(file_path, max_width, quality_guard)
         original_size = os.path.getsize(file_path)
         ext = file_path.suffix.lower()
         
@@ -34,19 +223,27 @@ def compress_image(file_path, max_width=1200, quality=80, create_webp=True):
             img = img.convert("RGB")
             
         # Resize if needed
-        width, height = img.size
         if width > max_width:
             ratio = max_width / width
             new_height = int(height * ratio)
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+            img = resize_for_target(img, (max_width, new_height), quality_guard)
             print(f"Resized {file_path.name}: {width}x{height} -> {max_width}x{new_height}")
             
+        chosen_qualities = {}
+        hints = quality_hints or {}
+        budget = target_kb * 1024 if target_kb else None
+        
         # Save optimized original
-        if ext in ['.jpg', '.jpeg']:
-            img.save(file_path, "JPEG", quality=quality, optimize=True)
+        if ext in ['.jpg', '.jpeg'] and budget:
+            data, chosen_qualities["jpeg"] = encode_to_budget(
+                img, "JPEG", budget, min_quality, quality, hint=hints.get("jpeg"), optimize=True
+            )
+            write_atomic(file_path, data)
+        elif ext in ['.jpg', '.jpeg']:
+            save_atomic(img, file_path, "JPEG", quality=quality, optimize=True)
         elif ext == '.png':
             # PNG optimization in PIL is limited but optimize=True helps
-            img.save(file_path, "PNG", optimize=True)
+            save_atomic(img, file_path, "PNG", optimize=True)
             
         new_size = os.path.getsize(file_path)
         saved = original_size - new_size
@@ -60,15 +257,241 @@ def compress_image(file_path, max_width=1200, quality=80, create_webp=True):
             # WebP supports transparency, so no need to convert mode usually,
             # but if we converted to RGB for JPG earlier, 'img' is now RGB.
             # If it was PNG (and we didn't convert to RGB), it might be RGBA.
-            img.save(webp_path, "WEBP", quality=quality)
+            if budget:
+                data, chosen_qualities["webp"] = encode_to_budget(
+                    img, "WEBP", budget, min_quality, quality, hint=hints.get("webp")
+                )
+                write_atomic(webp_path, data)
+            else:
+                save_atomic(img, webp_path, "WEBP", quality=quality)
             webp_size = os.path.getsize(webp_path)
             print(f"Created WebP {webp_path.name}: {get_size_format(webp_size)}")
             
-        return original_size, new_size
+        if chosen_qualities:
+            print(f"Chose quality for {file_path.name}: " + ", ".join(f"{k} q{v}" for k, v in chosen_qualities.items()))
+        return original_size, new_size, chosen_qualities
         
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
-        return 0, 0
+        return 0, 0, {}
+
+def generate_variants(file_path, source_root, variants_root, widths, formats, quality=80,
+                      quality_guard=DEFAULT_QUALITY_GUARD):
+    """
+    Decodes an image once and writes a ladder of resized variants.
+    - One variant per width in widths that is smaller than the source
+      (or a single source-width variant if none are), never upscaling
+    - Each width is written in every format in formats (see VARIANT_FORMATS)
+      as <stem>-<width>.<ext> under variants_root, mirroring the file's
+      location under source_root; the source is left untouched
+    - JPEG sources are decoded at reduced size when even the largest
+      variant is much smaller (see open_for_target)
+    
+    Returns (original_size, total_variant_bytes, variants) where variants
+    lists the path (relative to variants_root), format, dimensions and byte
+    size of each file written.
+    """
+    try:
+        with Image.open(file_path) as probe:
+            width, height = probe.size
+        targets = sorted({w for w in widths if w <= width}, reverse=True) or [width]
+        img, width, height = open_for_target(file_path, targets[0], quality_guard)
+        original_size = os.path.getsize(file_path)
+        
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        
+        out_dir = variants_root / file_path.relative_to(source_root).parent
+        out_dir.mkdir(parents=True, exist_ok=True)
+        
+        variants = []
+        total_bytes = 0
+        for target_width in targets:
+            target_height = max(1, round(height * target_width / width))
+            resized = img if img.size == (target_width, target_height) else resize_for_target(
+                img, (target_width, target_height), quality_guard
+            )
+            for fmt in formats:
+                pil_format, ext = VARIANT_FORMATS[fmt]
+                # JPEG has no alpha channel; the other formats keep it.
+                frame = resized.convert("RGB") if fmt == "jpeg" and resized.mode != "RGB" else resized
+                out_path = out_dir / f"{file_path.stem}-{target_width}{ext}"
+                params = {"quality": quality}
+                if fmt == "jpeg":
+                    params.update(optimize=True, progressive=True)
+                save_atomic(frame, out_path, pil_format, **params)
+                size = os.path.getsize(out_path)
+                total_bytes += size
+                variants.append({
+                    "path": out_path.relative_to(variants_root).as_posix(),
+                    "format": fmt,
+                    "width": target_width,
+                    "height": target_height,
+                    "bytes": size,
+                })
+        
+        print(f"Variants {file_path.name}: {width}x{height} -> {len(variants)} files, {get_size_format(total_bytes)}")
+        return original_size, total_bytes, variants
+        
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return 0, 0, None
+
+def _compress_task(task):
+    """
+    Process-pool entry point. Runs the worker function with its output
+    captured, so the parent can print each file's messages in order.
+    """
+    worker, file_path, options = task
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        result = worker(file_path, **options)
+    return result, buffer.getvalue()
+
+def compress_all(files, jobs=1, worker=compress_image, per_file_options=None, **options):
+    """
+    Run worker (compress_image by default) over files, yielding its result
+    per file in input order. With jobs > 1 the files are spread over a pool
+    of worker processes. per_file_options, if given, is a list of extra
+    keyword arguments for each file, merged over options.
+    """
+    per_file_options = per_file_options or [{}] * len(files)
+    if jobs <= 1:
+        for file_path, extra in zip(files, per_file_options):
+            yield worker(file_path, **options, **extra)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        tasks = ((worker, file_path, {**options, **extra}) for file_path, extra in zip(files, per_file_options))
+        for result, output in executor.map(_compress_task, tasks, chunksize=4):
+            print(output, end="")
+            yield result
+
+def _parse_widths(value):
+    return sorted({int(w) for w in value.split(",") if w.strip()})
+
+def _parse_formats(value):
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in VARIANT_FORMATS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown format(s): {', '.join(unknown)}")
+    return formats
+
+def print_quality_distribution(chosen):
+    """Summarize the qualities picked by --target-kb, per format."""
+    for fmt, qualities in sorted(chosen.items()):
+        qualities = sorted(qualities)
+        median = qualities[len(qualities) // 2]
+        print(f"{fmt.upper()} quality: min {qualities[0]}, median {median}, max {qualities[-1]} over {len(qualities)} images")
+        buckets = {}
+        for q in qualities:
+            bucket = q // 10 * 10
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        print("  " + "  ".join(f"{b}-{b + 9}: {n}" for b, n in sorted(buckets.items())))
+
+def run_variants(args, target_dir, files, jobs):
+    """
+    --variants mode: write a width/format ladder for each source image into
+    the variants directory (mirroring the source tree) and record every
+    variant's dimensions and size in its variants.json for building srcset.
+    Sources whose size, mtime and ladder settings are unchanged are skipped.
+    Variants are pruned along with their manifest entries when their source
+    is gone or they are no longer part of the current ladder, so stale files
+    aren't picked up as existing variants later.
+    """
+    variants_dir = Path(args.variants_dir) if args.variants_dir else target_dir.parent / f"{target_dir.name}_variants"
+    formats = list(args.formats)
+    if "avif" in formats and not features.check("avif"):
+        print("AVIF encoding is not available in this Pillow build; skipping AVIF variants.")
+        formats.remove("avif")
+    params = {"widths": args.variants, "formats": formats, "quality": args.quality, "quality_guard": args.quality_guard}
+    
+    manifest_path = variants_dir / VARIANTS_MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Ignoring unreadable manifest {manifest_path}: {e}")
+            manifest = {}
+    
+    def up_to_date(file_path, rel):
+        entry = manifest.get(rel)
+        if args.force or entry is None or entry["params"] != params:
+            return False
+        stat = file_path.stat()
+        if (stat.st_size, stat.st_mtime_ns) != (entry["sourceSize"], entry["sourceMtimeNs"]):
+            return False
+        return all((variants_dir / v["path"]).exists() for v in entry["variants"])
+    
+    def remove_variants(entry, keep=frozenset()):
+        removed = 0
+        for variant in entry["variants"]:
+            if variant["path"] not in keep:
+                (variants_dir / variant["path"]).unlink(missing_ok=True)
+                removed += 1
+        return removed
+    
+    # Checked against the disk rather than files, so --changes runs prune too.
+    pruned = 0
+    for rel in [rel for rel in manifest if not (target_dir / rel).is_file()]:
+        pruned += remove_variants(manifest.pop(rel))
+    
+    pending = []
+    for file_path in files:
+        rel = file_path.relative_to(target_dir)
+        if not up_to_date(file_path, rel.as_posix()):
+            pending.append((file_path, rel))
+    # Sources outside this run's files that were built with another ladder
+    # are regenerated too, which replaces their out-of-ladder variants.
+    queued = {rel.as_posix() for _, rel in pending}
+    stale = sorted(rel for rel, entry in manifest.items() if entry["params"] != params and rel not in queued)
+    pending.extend((target_dir / rel, Path(rel)) for rel in stale)
+    print(f"Generating variants for {len(pending)} images ({len(files) - len(pending)} up to date) into {variants_dir}")
+    
+    total_original = 0
+    total_variants = 0
+    results = compress_all(
+        [file_path for file_path, _ in pending],
+        jobs=jobs,
+        worker=generate_variants,
+        source_root=target_dir,
+        variants_root=variants_dir,
+        widths=args.variants,
+        formats=formats,
+        quality=args.quality,
+        quality_guard=args.quality_guard,
+    )
+    try:
+        for (file_path, rel), (orig, variant_bytes, variants) in zip(pending, results):
+            if variants is None:
+                continue
+            total_original += orig
+            total_variants += variant_bytes
+            previous = manifest.get(rel.as_posix())
+            if previous is not None:
+                pruned += remove_variants(previous, keep={v["path"] for v in variants})
+            stat = file_path.stat()
+            manifest[rel.as_posix()] = {
+                "sourceSize": stat.st_size,
+                "sourceMtimeNs": stat.st_mtime_ns,
+                "params": params,
+                "variants": variants,
+            }
+    finally:
+        variants_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_path.with_name(f".{manifest_path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    
+    print("\nSummary:")
+    print(f"Processed {len(pending)} images")
+    print(f"Removed {pruned} stale variant files")
+    print(f"Total Source Size: {get_size_format(total_original)}")
+    print(f"Total Variant Size: {get_size_format(total_variants)}")
 
 def main():
     parser = argparse.ArgumentParser(description="Compress images in a directory recursively.")
@@ -77,6 +500,22 @@ def main():
     parser.add_argument("--max-width", type=int, default=1200, help="Maximum width for images")
     parser.add_argument("--quality", type=int, default=80, help="JPEG/WebP quality (0-100)")
     parser.add_argument("--no-webp", action="store_true", help="Skip WebP generation")
+    parser.add_argument("--changes", help="Change set from google_places_api.py; only compress the photo files it lists")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes (0 = one per CPU core)")
+    parser.add_argument("--manifest", help=f"Manifest path (default: {MANIFEST_NAME} in the target directory)")
+    parser.add_argument("--force", action="store_true", help="Reprocess every image, ignoring the manifest")
+    parser.add_argument("--variants", type=_parse_widths,
+                        help="Comma-separated widths (e.g. 320,640,1200): write responsive variants instead of compressing in place")
+    parser.add_argument("--formats", type=_parse_formats, default=["jpeg", "webp", "avif"],
+                        help="Comma-separated variant formats (jpeg,webp,avif)")
+    parser.add_argument("--target-kb", type=int,
+                        help="Per-image byte budget in KB: search JPEG/WebP quality (up to --quality) to fit it")
+    parser.add_argument("--min-quality", type=int, default=DEFAULT_MIN_QUALITY,
+                        help="Lowest quality --target-kb may choose")
+    parser.add_argument("--quality-guard", type=float, default=DEFAULT_QUALITY_GUARD,
+                        help="When downscaling, keep at least this many source pixels per output pixel before "
+                             "the final LANCZOS pass (>= 1; lower is faster, 0 decodes at full size)")
+    parser.add_argument("--variants-dir", help="Output directory for variants (default: <directory>_variants)")
     
     args = parser.parse_args()
     
@@ -95,30 +534,99 @@ def main():
     total_new = 0
     files_processed = 0
     
-    for file_path in target_dir.rglob("*"):
-        if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-            # Skip if it looks like a thumbnail or something we shouldn't touch? 
-            # For now, process all.
-            
-            orig, new = compress_image(
-                file_path, 
-                max_width=args.max_width, 
-                quality=args.quality,
-                create_webp=not args.no_webp
-            )
-            
+    # Compression and variants are separate consumers of the change file, so
+    # each sees every photo written since it last ran.
+    consumer = "compress_variants" if args.variants else "compress"
+    if args.changes:
+        changes = pending_changes(consumer, args.changes)
+        candidates = [target_dir / rel_path for rel_path in changes["photoFiles"]]
+    else:
+        candidates = target_dir.rglob("*")
+    
+    # Sorted so output and processing order are the same on every run.
+    files = sorted(
+        file_path for file_path in candidates
+        if file_path.is_file() and file_path.suffix.lower() in image_extensions
+    )
+    
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.variants:
+        run_variants(args, target_dir, files, jobs)
+        if args.changes:
+            mark_consumed(consumer, changes, args.changes)
+        return
+    
+    # Skip images the manifest says were already processed with these
+    # parameters. Recompressing them would only add generation loss.
+    manifest_path = Path(args.manifest) if args.manifest else target_dir / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    params = {"max_width": args.max_width, "quality": args.quality, "webp": not args.no_webp}
+    if args.quality_guard != DEFAULT_QUALITY_GUARD:
+        params["quality_guard"] = args.quality_guard
+    if args.target_kb:
+        params.update(target_kb=args.target_kb, min_quality=args.min_quality)
+    if not args.changes:
+        # Forget images that no longer exist after a full scan.
+        present = {file_path.relative_to(target_dir).as_posix() for file_path in files}
+        manifest = {rel: entry for rel, entry in manifest.items() if rel in present}
+    to_process = [
+        file_path for file_path in files
+        if args.force or not is_up_to_date(file_path, manifest.get(file_path.relative_to(target_dir).as_posix()), params)
+    ]
+    files_skipped = len(files) - len(to_process)
+    
+    if jobs > 1:
+        print(f"Compressing {len(to_process)} images with {jobs} worker processes...")
+    
+    # Qualities chosen by earlier --target-kb runs seed each file's search.
+    per_file_options = None
+    if args.target_kb:
+        per_file_options = [
+            {"quality_hints": manifest.get(file_path.relative_to(target_dir).as_posix(), {}).get("chosen_quality")}
+            for file_path in to_process
+        ]
+    
+    results = compress_all(
+        to_process,
+        jobs=jobs,
+        per_file_options=per_file_options,
+        max_width=args.max_width,
+        quality=args.quality,
+        create_webp=not args.no_webp,
+        quality_guard=args.quality_guard,
+        target_kb=args.target_kb,
+        min_quality=args.min_quality
+    )
+    chosen = {}
+    try:
+        for file_path, (orig, new, chosen_qualities) in zip(to_process, results):
             total_original += orig
             total_new += new
             files_processed += 1
+            if new > 0:
+                entry = manifest_entry(file_path, params)
+                if chosen_qualities:
+                    entry["chosen_quality"] = chosen_qualities
+                manifest[file_path.relative_to(target_dir).as_posix()] = entry
+            for fmt, q in chosen_qualities.items():
+                chosen.setdefault(fmt, []).append(q)
+    finally:
+        # Saved even if interrupted, so finished work isn't redone next run.
+        save_manifest(manifest_path, manifest)
+    if args.changes:
+        mark_consumed(consumer, changes, args.changes)
             
     print("\nSummary:")
     print(f"Processed {files_processed} images")
+    print(f"Skipped {files_skipped} unchanged images")
     print(f"Total Original Size: {get_size_format(total_original)}")
     print(f"Total New Size: {get_size_format(total_new)}")
     if total_original > 0:
         total_saved = total_original - total_new
         percent = (total_saved / total_original) * 100
         print(f"Total Saved: {get_size_format(total_saved)} ({percent:.1f}%)")
+    if chosen:
+        print_quality_distribution(chosen)
 
 if __name__ == "__main__":
     main()
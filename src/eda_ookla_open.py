@@ -18,13 +18,18 @@ def _():
 
 @app.cell
 def _():
-    f_sample = r"C:\Users\jdc\Documents\GithubPersonal\jdc.code.brewsandbytes\ookla\open\year=2019\quarter=1\2019-01-01_performance_fixed_tiles.parquet"
-    return (f_sample,)
+    from ookla_reader import OoklaReader
+
+    # (south, west, north, east) around Somerset West / Stellenbosch
+    bbox = (-34.15, 18.75, -33.85, 18.95)
+    reader = OoklaReader()
+    return OoklaReader, bbox, reader
 
 
 @app.cell
-def _(f_sample, pd):
-    df_ookla = pd.read_parquet(f_sample)
+def _(bbox, reader):
+    # Only the 2019 Q1 row groups overlapping bbox are read.
+    df_ookla = reader.to_arrow(years=[2019], quarters=[1], bbox=bbox)
     return (df_ookla,)
 
 
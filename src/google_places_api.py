@@ -1,10 +1,26 @@
 import os
+import argparse
 import requests
 import json
 import logging
+import random
 import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+
+from place_delta import CHANGES_FILE, compute_changes, photo_names, write_changes
+from photo_store import PHOTO_STORE_DIR, PhotoStore
+from place_store import PlaceStore
+from places_cache import CACHE_FILE, DEFAULT_TTL_SECONDS, ResponseCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,79 +31,455 @@ API_KEY_ENV_VAR = "GOOGLE_PLACES_API_KEY"
 BASE_URL = "https://places.googleapis.com/v1/places:searchText"
 IMAGES_DIR = "places_images"
 DATA_FILE = "places_data.json"
+# Upper bound on simultaneous requests, also used to size the keep-alive connection pool.
+DEFAULT_MAX_CONCURRENCY = 8
+# Photos are streamed to disk in chunks of this size rather than buffered whole.
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Text Search defaults to a 600 requests/minute quota per project.
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+# Photo media GETs are billed and throttled separately from Text Search, so
+# they get their own limiter. None means no rate cap: downloads are bounded
+# only by the in-flight limit, and 429s are still retried with backoff.
+DEFAULT_MEDIA_REQUESTS_PER_SECOND: Optional[float] = None
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 30
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Text Search returns at most 20 places per page and 60 places (3 pages) per query.
+PAGE_SIZE = 20
+MAX_PAGES = 3
+# How many times harvest_area may split a saturated tile into quadrants.
+DEFAULT_MAX_TILE_DEPTH = 6
+# FieldMask (sent as X-Goog-FieldMask) specifies which fields to return to save bandwidth and latency.
+# We request fields corresponding to the user's requirements:
+# - Name: displayName
+# - Address: formattedAddress
+# - Coordinates: location
+# - Ratings: rating, userRatingCount
+# - Meta info: businessStatus, types, priceLevel
+# - Accessibility: accessibilityOptions
+# - Contact: internationalPhoneNumber, websiteUri
+# - Photo: photos
+# - Pagination: nextPageToken
+SEARCH_FIELD_MASK = (
+    "places.id,"
+    "places.displayName,"
+    "places.formattedAddress,"
+    "places.location,"
+    "places.rating,"
+    "places.userRatingCount,"
+    "places.businessStatus,"
+    "places.types,"
+    "places.priceLevel,"
+    "places.accessibilityOptions,"
+    "places.internationalPhoneNumber,"
+    "places.websiteUri,"
+    "places.photos,"
+    "places.regularOpeningHours,"
+    "nextPageToken"
+)
+
+class CacheMissError(LookupError):
+    """Raised in cache-only mode when a request has no cached response."""
+
+class RateLimiter:
+    """
+    Client-side throttle combining a token bucket (requests per second, with a
+    small burst allowance) and a cap on the number of requests in flight.
+    
+    Use it as a context manager around each request:
+    
+        with limiter:
+            session.get(...)
+    """
+    def __init__(self, requests_per_second: Optional[float] = DEFAULT_REQUESTS_PER_SECOND,
+                 max_in_flight: int = DEFAULT_MAX_CONCURRENCY, burst: Optional[int] = None):
+        self.requests_per_second = requests_per_second
+        self.capacity = burst or max(1, int(requests_per_second or 1))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def _take_token(self):
+        if not self.requests_per_second:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.requests_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.requests_per_second
+            time.sleep(wait)
+
+    def __enter__(self):
+        self._in_flight.acquire()
+        try:
+            self._take_token()
+        except BaseException:
+            self._in_flight.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._in_flight.release()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delay in seconds or an HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 class GooglePlacesClient:
     """
     Client for interacting with the Google Places API (New).
     """
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, pool_size: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_second: Optional[float] = DEFAULT_REQUESTS_PER_SECOND,
+                 max_in_flight: int = DEFAULT_MAX_CONCURRENCY, max_retries: int = DEFAULT_MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, cache_only: bool = False,
+                 media_requests_per_second: Optional[float] = DEFAULT_MEDIA_REQUESTS_PER_SECOND):
         self.api_key = api_key or os.environ.get(API_KEY_ENV_VAR)
-        if not self.api_key:
+        # Cache-only runs never touch the network, so they don't need a key.
+        if not self.api_key and not cache_only:
             logger.error(f"API Key not found. Please set {API_KEY_ENV_VAR} environment variable.")
             raise ValueError(f"API Key not found. Please set {API_KEY_ENV_VAR} environment variable.")
+
+        # One session for the lifetime of the client so TCP/TLS connections are
+        # reused across calls instead of being re-established for every request.
+        self.session = requests.Session()
+        self.pool_size = 0
+        self.ensure_pool_size(max(pool_size, max_in_flight))
+
+        # Text Search calls and photo media downloads are throttled independently.
+        self.rate_limiter = RateLimiter(requests_per_second, max_in_flight=max_in_flight)
+        self.media_rate_limiter = RateLimiter(media_requests_per_second, max_in_flight=max_in_flight)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.cache_only = cache_only
+        if cache_only and cache is None:
+            raise ValueError("cache_only requires a ResponseCache.")
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters for this client's HTTP traffic:
+        requests (attempts sent), retries, throttled (429 responses),
+        server_errors (5xx responses), connection_errors and failures
+        (requests that still failed after all retries), plus cache_hits and
+        cache_misses when a response cache is configured.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def ensure_pool_size(self, size: int):
+        """
+        Grow the keep-alive connection pool to at least size connections, so
+        that many concurrent workers each keep their connection instead of
+        having it discarded with "Connection pool is full".
+        """
+        if size <= self.pool_size:
+            return
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.pool_size = size
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, BACKOFF_BASE_SECONDS))
+        return delay
+
+    def _request(self, method: str, url: str, limiter: Optional[RateLimiter] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through a rate limiter (the Text Search one unless
+        another is given), retrying 429/5xx responses and
+        connection errors with jittered exponential backoff.
         
-    def search_places(self, query: str) -> List[Dict]:
+        The final response is returned whatever its status, so callers still use
+        raise_for_status(); connection errors are re-raised once retries run out.
         """
-        Search for places using the Google Places API (New) Text Search.
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT_SECONDS)
+        attempt = 0
+        while True:
+            retry_after = None
+            with limiter or self.rate_limiter:
+                self._count("requests")
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    self._count("connection_errors")
+                    if attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+                    response = None
+
+            if response is not None:
+                if response.status_code == 429:
+                    self._count("throttled")
+                elif response.status_code >= 500:
+                    self._count("server_errors")
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+
+            # Sleep outside the limiter so waiting retries don't hold an in-flight slot.
+            delay = self._backoff_delay(attempt, retry_after)
+            attempt += 1
+            self._count("retries")
+            logger.warning(f"Retrying {method} {url} in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def close(self):
+        """Close the underlying HTTP session and its pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _search_text(self, payload: Dict) -> Dict:
+        """
+        POST a Text Search request, consulting the response cache first.
         
         Args:
-            query (str): The text query to search for (e.g., "restaurants in Somerset West").
+            payload (Dict): The JSON body of the request (textQuery, pageToken, ...).
             
         Returns:
-            List[Dict]: A list of place objects containing the requested details.
+            Dict: The decoded response body.
         """
+        cached = self._cached_search(payload)
+        if cached is not None:
+            return cached
+        return self._fetch_search(payload)
+
+    def _cached_search(self, payload: Dict) -> Optional[Dict]:
+        """
+        Look up a Text Search response in the cache, counting the hit or miss.
+        In cache-only mode a miss raises CacheMissError instead of returning None.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(payload, SEARCH_FIELD_MASK, allow_stale=self.cache_only)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached
+            self._count("cache_misses")
+        if self.cache_only:
+            raise CacheMissError(f"No cached response for {payload} and cache-only mode is enabled.")
+        return None
+
+    def _fetch_search(self, payload: Dict) -> Dict:
+        """POST a Text Search request to the API and cache the response."""
         headers = {
             "Content-Type": "application/json",
             "X-Goog-Api-Key": self.api_key,
-            # FieldMask specifies which fields to return to save bandwidth and latency.
-            # We request fields corresponding to the user's requirements:
-            # - Name: displayName
-            # - Address: formattedAddress
-            # - Coordinates: location
-            # - Ratings: rating, userRatingCount
-            # - Meta info: businessStatus, types, priceLevel
-            # - Accessibility: accessibilityOptions
-            # - Contact: internationalPhoneNumber, websiteUri
-            # - Photo: photos
-            "X-Goog-FieldMask": (
-                "places.id,"
-                "places.displayName,"
-                "places.formattedAddress,"
-                "places.location,"
-                "places.rating,"
-                "places.userRatingCount,"
-                "places.businessStatus,"
-                "places.types,"
-                "places.priceLevel,"
-                "places.accessibilityOptions,"
-                "places.internationalPhoneNumber,"
-                "places.websiteUri,"
-                "places.photos,"
-                "places.regularOpeningHours"
-            )
-        }
-        
-        payload = {
-            "textQuery": query
+            "X-Goog-FieldMask": SEARCH_FIELD_MASK,
         }
         
         response = None
         try:
-            logger.info(f"Searching for: {query}")
-            response = requests.post(BASE_URL, headers=headers, json=payload)
+            response = self._request("POST", BASE_URL, headers=headers, json=payload)
             response.raise_for_status()
-            
             data = response.json()
-            places = data.get("places", [])
-            logger.info(f"Found {len(places)} places for query: {query}")
-            return places
-            
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {e}")
             if response is not None:
                 logger.error(f"Response content: {response.text}")
             raise
 
+        if self.cache is not None:
+            self.cache.put(payload, SEARCH_FIELD_MASK, data)
+        return data
+
+    def _cached_pages(self, payload: Dict, max_pages: int) -> Optional[List[Dict]]:
+        """
+        The cached responses for a query's whole page chain, or None if any
+        page is missing or expired.
+
+        Page tokens are only valid for a short time, so a chain is served from
+        the cache or fetched as a unit: a fresh first page must not lead to
+        requesting a later page with the token it cached long ago.
+        """
+        pages = []
+        next_page_token = None
+        for _ in range(max_pages):
+            page_payload = dict(payload, pageToken=next_page_token) if next_page_token else payload
+            data = self._cached_search(page_payload)
+            if data is None:
+                return None
+            pages.append(data)
+            next_page_token = data.get("nextPageToken")
+            if not next_page_token:
+                break
+        return pages
+
+    def search_places(self, query: str) -> List[Dict]:
+        """
+        Search for places using the Google Places API (New) Text Search.
+        
+        Args:
+            query (str): The text query to search for (e.g., "restaurants in Somerset West").
+            
+        Returns:
+            List[Dict]: A list of place objects containing the requested details.
+        """
+        logger.info(f"Searching for: {query}")
+        data = self._search_text({"textQuery": query})
+        places = data.get("places", [])
+        logger.info(f"Found {len(places)} places for query: {query}")
+        return places
+
+    def search_places_paged(self, query: str, location_restriction: Optional[Dict] = None,
+                            max_pages: int = MAX_PAGES) -> Tuple[List[Dict], bool]:
+        """
+        Search for places, following nextPageToken across result pages.
+        
+        Args:
+            query (str): The text query to search for.
+            location_restriction (Dict): Optional Text Search locationRestriction
+                (e.g. {"rectangle": {"low": {...}, "high": {...}}}).
+            max_pages (int): The maximum number of pages to fetch.
+            
+        Returns:
+            Tuple[List[Dict], bool]: The places found, and whether the results were
+            truncated (more pages remained, or the per-query result cap was hit).
+        """
+        payload = {"textQuery": query, "pageSize": PAGE_SIZE}
+        if location_restriction:
+            payload["locationRestriction"] = location_restriction
+
+        pages = self._cached_pages(payload, max_pages)
+        if pages is None:
+            # Refetch the whole chain so every page token used is a fresh one.
+            pages = []
+            next_page_token = None
+            for _ in range(max_pages):
+                page_payload = dict(payload, pageToken=next_page_token) if next_page_token else payload
+                data = self._fetch_search(page_payload)
+                pages.append(data)
+                next_page_token = data.get("nextPageToken")
+                if not next_page_token:
+                    break
+
+        places = [place for data in pages for place in data.get("places", [])]
+        next_page_token = pages[-1].get("nextPageToken") if pages else None
+
+        truncated = bool(next_page_token) or len(places) >= PAGE_SIZE * max_pages
+        return places, truncated
+
+    def harvest_area(self, query: str, bbox: Tuple[float, float, float, float],
+                     max_depth: int = DEFAULT_MAX_TILE_DEPTH,
+                     max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Iterator[Dict]:
+        """
+        Exhaustively harvest places matching a query inside a bounding box.
+        
+        Each tile is searched with a rectangular locationRestriction, following
+        page tokens. A tile that comes back saturated (the API had more results
+        than it would return) is split into four sub-tiles which are searched in
+        the next wave, so API calls concentrate where places are dense instead of
+        growing with the area covered. Places are yielded as soon as they are
+        found, each place ID at most once.
+        
+        Args:
+            query (str): The text query to search for (e.g., "coffee shops").
+            bbox (Tuple[float, float, float, float]): (south, west, north, east) in degrees.
+            max_depth (int): The maximum number of times a tile may be subdivided.
+            max_concurrency (int): The maximum number of tiles searched at once.
+            
+        Yields:
+            Dict: Place objects, deduplicated by ID.
+        """
+        seen_ids = set()
+        wave = [(bbox, 0)]
+        self.ensure_pool_size(max_concurrency)
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            while wave:
+                futures = {
+                    executor.submit(self.search_places_paged, query, bbox_to_rectangle(tile)): (tile, depth)
+                    for tile, depth in wave
+                }
+                next_wave = []
+                for future in as_completed(futures):
+                    tile, depth = futures[future]
+                    try:
+                        places, truncated = future.result()
+                    except (requests.exceptions.RequestException, CacheMissError) as e:
+                        logger.warning(f"Skipping tile {tile} for '{query}': {e}")
+                        continue
+
+                    for place in places:
+                        if place.get('id') not in seen_ids:
+                            seen_ids.add(place.get('id'))
+                            yield place
+
+                    if truncated:
+                        if depth < max_depth:
+                            next_wave.extend((sub_tile, depth + 1) for sub_tile in split_bbox(tile))
+                        else:
+                            logger.warning(f"Tile {tile} is still saturated at max depth {max_depth}; some places may be missed.")
+                wave = next_wave
+
+        logger.info(f"Harvested {len(seen_ids)} unique places for '{query}'")
+
+    def search_many(self, queries: List[str], max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> Dict[str, List[Dict]]:
+        """
+        Run several text searches concurrently over the shared connection pool.
+        
+        Args:
+            queries (List[str]): The text queries to search for. Duplicates are searched once.
+            max_concurrency (int): The maximum number of searches in flight at once.
+            
+        Returns:
+            Dict[str, List[Dict]]: Places found for each query, in the order the queries were given.
+            A query whose request failed maps to an empty list (the error is logged).
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        if not unique_queries:
+            return {}
+
+        results: Dict[str, List[Dict]] = {}
+        workers = max(1, min(max_concurrency, len(unique_queries)))
+        self.ensure_pool_size(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.search_places, query): query for query in unique_queries}
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    results[query] = future.result()
+                except requests.exceptions.RequestException:
+                    # search_places has already logged the failure details.
+                    results[query] = []
+                except CacheMissError as e:
+                    logger.warning(str(e))
+                    results[query] = []
+
+        return {query: results[query] for query in unique_queries}
+
     def download_photo(self, photo_name: str, max_width: int = 1600, max_height: int = 1600) -> Optional[bytes]:
         """
         Download a photo from the Google Places API.
@@ -109,66 +501,189 @@ class GooglePlacesClient:
         
         try:
             # By default, requests follows redirects. The API redirects to the image URL.
-            response = requests.get(url, params=params)
+            response = self._request("GET", url, limiter=self.media_rate_limiter, params=params)
             response.raise_for_status()
             return response.content
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to download photo {photo_name}: {e}")
             return None
 
+    def download_photo_to(self, photo_name: str, dest_path: Path, max_width: int = 1600, max_height: int = 1600) -> bool:
+        """
+        Stream a photo from the Google Places API straight to disk.
+        
+        The body is written in chunks to a temporary file next to dest_path and
+        atomically renamed into place, so a failed or interrupted download never
+        leaves a truncated image behind.
+        
+        Args:
+            photo_name (str): The resource name of the photo (e.g., "places/PLACE_ID/photos/PHOTO_ID").
+            dest_path (Path): Where the photo should be written.
+            max_width (int): The maximum width of the photo.
+            max_height (int): The maximum height of the photo.
+            
+        Returns:
+            bool: True if the photo was written, False otherwise.
+        """
+        url = f"https://places.googleapis.com/v1/{photo_name}/media"
+        params = {
+            "key": self.api_key,
+            "maxHeightPx": max_height,
+            "maxWidthPx": max_width,
+        }
+        
+        dest_path = Path(dest_path)
+        tmp_path = None
+        try:
+            with self._request("GET", url, limiter=self.media_rate_limiter, params=params, stream=True) as response:
+                response.raise_for_status()
+                with tempfile.NamedTemporaryFile(
+                    dir=dest_path.parent, prefix=f".{dest_path.name}.", suffix=".part", delete=False
+                ) as tmp:
+                    tmp_path = Path(tmp.name)
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        tmp.write(chunk)
+            os.replace(tmp_path, dest_path)
+            return True
+        except (requests.exceptions.RequestException, OSError) as e:
+            logger.error(f"Failed to download photo {photo_name}: {e}")
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
+            return False
+
+    def download_photos(self, jobs: List[Tuple[str, Path]], max_workers: int = DEFAULT_MAX_CONCURRENCY) -> List[Path]:
+        """
+        Download many photos with a bounded pool of workers.
+        
+        Args:
+            jobs (List[Tuple[str, Path]]): (photo resource name, destination path) pairs.
+            max_workers (int): The maximum number of downloads in flight at once.
+            
+        Returns:
+            List[Path]: The destination paths that were written successfully.
+        """
+        if not jobs:
+            return []
+
+        downloaded = []
+        workers = max(1, min(max_workers, len(jobs)))
+        self.ensure_pool_size(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.download_photo_to, photo_name, dest): dest for photo_name, dest in jobs}
+            for future in as_completed(futures):
+                if future.result():
+                    downloaded.append(futures[future])
+
+        logger.info(f"Downloaded {len(downloaded)}/{len(jobs)} photos")
+        return downloaded
+
+def bbox_to_rectangle(bbox: Tuple[float, float, float, float]) -> Dict:
+    """Convert a (south, west, north, east) box into a Text Search locationRestriction."""
+    south, west, north, east = bbox
+    return {
+        "rectangle": {
+            "low": {"latitude": south, "longitude": west},
+            "high": {"latitude": north, "longitude": east},
+        }
+    }
+
+def split_bbox(bbox: Tuple[float, float, float, float]) -> List[Tuple[float, float, float, float]]:
+    """Split a (south, west, north, east) box into its four quadrants."""
+    south, west, north, east = bbox
+    mid_lat = (south + north) / 2
+    mid_lng = (west + east) / 2
+    return [
+        (south, west, mid_lat, mid_lng),
+        (south, mid_lng, mid_lat, east),
+        (mid_lat, west, north, mid_lng),
+        (mid_lat, mid_lng, north, east),
+    ]
+
 def sanitize_filename(name: str) -> str:
     """Sanitize a string to be safe for use as a filename/directory name."""
     # Remove invalid characters
     return re.sub(r'[<>:"/\\|?*]', '', name).strip()
 
-def save_places_data(places: List[Dict], filename: str):
+def open_place_store(filename: str) -> PlaceStore:
     """
-    Append places to a JSON file.
-    Reads existing data, appends new unique places, and writes back.
+    Open the incremental place store that backs filename (same path with a
+    .db suffix), importing an existing JSON file into it on first use.
     """
-    existing_places = []
-    if os.path.exists(filename):
+    store = PlaceStore(Path(filename).with_suffix(".db"))
+    if store.count() == 0 and os.path.exists(filename):
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                existing_places = json.load(f)
+            store.import_json(filename)
         except json.JSONDecodeError:
-            logger.warning(f"Could not decode {filename}, starting with empty list.")
-    
-    # Create a map of existing places by ID to avoid duplicates
-    places_map = {p['id']: p for p in existing_places}
-    
-    # Update/Add new places
-    for p in places:
-        places_map[p['id']] = p
-        
-    final_list = list(places_map.values())
+            logger.warning(f"Could not decode {filename}, starting with empty store.")
+    return store
+
+def save_places_data(places: List[Dict], filename: str):
+    """
+    Upsert places into the incremental place store and refresh the JSON file.
     
+    The store is the source of truth: only new or changed places are written
+    to it, and the JSON array consumed by transform_places.py is re-exported
+    atomically only when something changed.
+    """
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(final_list, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(final_list)} places to {filename}")
-    except IOError as e:
-        logger.error(f"Failed to save to file: {e}")
+        with open_place_store(filename) as store:
+            added, updated, unchanged = store.upsert_many(places)
+            logger.info(f"Place store {store.path}: {added} added, {updated} updated, {unchanged} unchanged")
+            
+            if added or updated or not os.path.exists(filename):
+                total = store.export_json(filename)
+                logger.info(f"Saved {total} places to {filename}")
+    except (IOError, sqlite3.Error) as e:
+        logger.error(f"Failed to save places: {e}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Harvest places and photos from the Google Places API.")
+    parser.add_argument("--cache-file", default=CACHE_FILE, help="SQLite file for cached search responses")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_SECONDS,
+                        help="Seconds a cached search response stays fresh")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API and don't cache responses")
+    parser.add_argument("--cache-only", action="store_true",
+                        help="Serve searches from the cache only and never call the API (photos are skipped)")
+    parser.add_argument("--harvest-bbox", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        help="Exhaustively harvest each category inside this bounding box using adaptive tiling")
+    parser.add_argument("--max-tile-depth", type=int, default=DEFAULT_MAX_TILE_DEPTH,
+                        help="Maximum number of times a saturated tile is subdivided in harvest mode")
+    parser.add_argument("--photo-store", default=PHOTO_STORE_DIR,
+                        help="Directory of the content-addressed photo store")
+    parser.add_argument("--changes-file", default=CHANGES_FILE,
+                        help="Change file that accumulates change sets for downstream steps")
+    parser.add_argument("--detect-removed", action="store_true",
+                        help="Report stored places missing from this harvest as removed "
+                             "(only use when the harvest covers everything in the store)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     # Example usage
     try:
         # Check if API key is set, otherwise mock or warn
-        if not os.environ.get(API_KEY_ENV_VAR):
+        if not os.environ.get(API_KEY_ENV_VAR) and not args.cache_only:
             logger.warning("GOOGLE_PLACES_API_KEY not set. Please set it to run the script.")
             return
 
-        client = GooglePlacesClient()
+        cache = None
+        if args.cache_only or not args.no_cache:
+            cache = ResponseCache(args.cache_file, ttl_seconds=args.cache_ttl)
+        client = GooglePlacesClient(cache=cache, cache_only=args.cache_only)
         
         categories = ["restaurants", "coffeeshops"]
         location = "Somerset West"
         
         all_places = []
-        
-        for category in categories:
-            query = f"{category} in {location}"
-            places = client.search_places(query)
-            all_places.extend(places)
+        if args.harvest_bbox:
+            bbox = tuple(args.harvest_bbox)
+            for category in categories:
+                all_places.extend(client.harvest_area(category, bbox, max_depth=args.max_tile_depth))
+        else:
+            queries = [f"{category} in {location}" for category in categories]
+            results = client.search_many(queries, max_concurrency=DEFAULT_MAX_CONCURRENCY)
+            for places in results.values():
+                all_places.extend(places)
             
         # Deduplicate places based on 'id' locally before processing
         unique_places_map = {p['id']: p for p in all_places}
@@ -176,51 +691,114 @@ def main():
         
         logger.info(f"Total unique places found in this run: {len(unique_places)}")
         
+        # Compare against the stored snapshot before it is overwritten.
+        with open_place_store(DATA_FILE) as store:
+            previous = store.get_many(p['id'] for p in unique_places)
+            stored_ids = set(store.all_ids())
+        changes = compute_changes(previous, unique_places, stored_ids if args.detect_removed else None)
+        
         # Process photos and save
         base_images_dir = Path(IMAGES_DIR)
         base_images_dir.mkdir(exist_ok=True)
         
+        # Photos are kept once each in a content-addressed store; the
+        # places_images/<place name>/photo_N.jpg layout the website reads is a
+        # view materialized from it. Only photos the store has never seen are
+        # downloaded, through one bounded worker pool.
+        photo_store = PhotoStore(args.photo_store)
+        view_jobs = []
+        download_jobs = []
+        # Places whose names sanitize to the same directory share it. The photo
+        # store remembers which place owns each directory, so a partial harvest
+        # doesn't hand it to another place. A new directory, or one whose owner
+        # is gone, goes to the lowest place ID, so which place's photos it shows
+        # (and the URLs transform_places writes for it) doesn't depend on
+        # harvest order.
+        harvested_dirs = {}
+        for place in unique_places:
+            dir_name = sanitize_filename(place.get('displayName', {}).get('text', 'Unknown'))
+            harvested_dirs.setdefault(dir_name, set()).add(place['id'])
+        stored_owners = photo_store.dir_owners()
+        removed_ids = set(changes['removed'])
+        dir_owners = {}
+        for dir_name, place_ids in harvested_dirs.items():
+            owner = stored_owners.get(dir_name)
+            # The owner lets go if it was removed, or now harvests under another name.
+            gone = owner not in stored_ids or owner in unique_places_map
+            if owner is None or owner in removed_ids or (owner not in place_ids and gone):
+                owner = min(place_ids)
+                photo_store.set_dir_owner(dir_name, owner)
+            dir_owners[dir_name] = owner
         for place in unique_places:
             place_name = place.get('displayName', {}).get('text', 'Unknown')
-            place_id = place.get('id')
             sanitized_name = sanitize_filename(place_name)
             
             # Create directory for the place
-            # We append ID to ensure uniqueness if names are same?
-            # User said "directory with the name of the place". 
-            # If duplicates exist, we might overwrite or mix. 
-            # Let's use name, but if we have multiple places with same name, maybe add ID.
-            # For now, just name as requested.
+            owner = dir_owners[sanitized_name]
             place_dir = base_images_dir / sanitized_name
             place_dir.mkdir(exist_ok=True)
             
-            photos = place.get('photos', [])
-            if photos:
-                logger.info(f"Downloading {len(photos)} photos for {place_name}...")
-                for i, photo in enumerate(photos):
-                    photo_name = photo.get('name')
-                    if photo_name:
-                        # Construct a filename.
-                        # photo_name looks like "places/PLACE_ID/photos/PHOTO_ID"
-                        # We can use the last part or just index.
-                        file_ext = "jpg" # API returns JPEG by default usually
-                        # we can try to infer content type from response headers if we want, 
-                        # but for now assume jpg or check later.
-                        
-                        image_filename = f"photo_{i+1}.{file_ext}"
-                        image_path = place_dir / image_filename
-                        
-                        # Check if already exists to avoid re-downloading
-                        if not image_path.exists():
-                            content = client.download_photo(photo_name)
-                            if content:
-                                with open(image_path, "wb") as f:
-                                    f.write(content)
-                        else:
-                            logger.info(f"Photo {image_filename} already exists.")
+            old_photo_names = photo_names(previous.get(place['id'], {}))
+            for i, photo in enumerate(place.get('photos', [])):
+                photo_name = photo.get('name')
+                if not photo_name:
+                    continue
+                # photo_name looks like "places/PLACE_ID/photos/PHOTO_ID"; the API
+                # returns JPEG by default so files are named by position.
+                image_path = place_dir / f"photo_{i+1}.jpg"
+                
+                if photo_store.lookup(place['id'], photo_name) is None:
+                    same_photo = i < len(old_photo_names) and old_photo_names[i] == photo_name
+                    if image_path.exists() and same_photo:
+                        # Harvested before the store existed: adopt the file instead of re-downloading.
+                        photo_store.adopt(image_path, place['id'], photo_name)
+                    else:
+                        download_jobs.append((place['id'], photo_name))
+                
+                if owner == place['id']:
+                    view_jobs.append((place['id'], photo_name, image_path))
+                elif i == 0:
+                    logger.warning(f"{place_name} ({place['id']}) shares a directory with {owner}; not overwriting its photos.")
+        
+        if args.cache_only:
+            logger.info(f"Cache-only mode: skipping {len(download_jobs)} photo downloads.")
+        else:
+            logger.info(f"Downloading {len(download_jobs)} new photos...")
+            staged = {photo_store.staging_path(photo_name): (place_id, photo_name) for place_id, photo_name in download_jobs}
+            downloaded = client.download_photos(
+                [(photo_name, path) for path, (_, photo_name) in staged.items()],
+                max_workers=DEFAULT_MAX_CONCURRENCY,
+            )
+            for path in downloaded:
+                photo_store.add_file(path, *staged[path])
+        
+        photo_files = []
+        for place_id, photo_name, image_path in view_jobs:
+            digest = photo_store.lookup(place_id, photo_name)
+            if digest and photo_store.materialize(digest, image_path):
+                photo_files.append(image_path.relative_to(base_images_dir).as_posix())
+        changes["photoFiles"] = sorted(photo_files)
+        # Drop photo_N files beyond each owner's photo count, left by a previous
+        # owner of the directory or by the place having had more photos.
+        for place in unique_places:
+            dir_name = sanitize_filename(place.get('displayName', {}).get('text', 'Unknown'))
+            if dir_owners[dir_name] == place['id']:
+                pruned = photo_store.prune_views(base_images_dir / dir_name, len(place.get('photos', [])))
+                if pruned:
+                    logger.info(f"Removed {pruned} stale photo files from {dir_name}")
+        photo_store.close()
+        logger.info(f"HTTP stats: {client.stats}")
 
         # Save data to JSON
         save_places_data(unique_places, DATA_FILE)
+        write_changes(changes, args.changes_file)
+        client.close()
+        if cache is not None:
+            # Cache-only runs serve expired entries as stale hits; purging them
+            # would leave the next offline run with nothing.
+            if not args.cache_only:
+                cache.purge_expired()
+            cache.close()
         
     except Exception as e:
         logger.error(f"An error occurred: {e}")
@@ -0,0 +1,126 @@
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import duckdb
+
+from ookla_reader import OOKLA_ROOT, TILE_TYPES, OoklaReader, sql_string
+from quadkey import OOKLA_ZOOM
+
+logger = logging.getLogger(__name__)
+
+# Constants
+EXTRACTS_DIR = "ookla/extracts"
+DEFAULT_ZOOMS = [14, OOKLA_ZOOM]
+# Small row groups keep the min/max statistics tight, so a quadkey range or
+# a single quarter only touches a few of them.
+EXTRACT_ROW_GROUP_SIZE = 16_384
+
+# Areas we serve, as (south, west, north, east). Override with --regions-file.
+SERVICE_REGIONS: Dict[str, Tuple[float, float, float, float]] = {
+    "somerset_west": (-34.15, 18.75, -34.00, 18.95),
+    "stellenbosch": (-34.00, 18.78, -33.88, 18.92),
+    "cape_town": (-34.36, 18.30, -33.70, 18.95),
+}
+
+def load_regions(path: Optional[str] = None) -> Dict[str, Tuple[float, float, float, float]]:
+    """Service regions from a JSON file of {name: [south, west, north, east]}, or the built-in ones."""
+    if not path:
+        return dict(SERVICE_REGIONS)
+    with open(path, 'r', encoding='utf-8') as f:
+        return {name: tuple(bbox) for name, bbox in json.load(f).items()}
+
+def extract_path(out_dir: str, tile_type: str, zoom: int) -> str:
+    return os.path.join(out_dir, f"{tile_type}_z{zoom}.parquet")
+
+def aggregate_sql(reader: OoklaReader, regions: Dict[str, Tuple[float, float, float, float]], zoom: int,
+                  years: Optional[Iterable[int]] = None, quarters: Optional[Iterable[int]] = None) -> str:
+    """
+    Test-weighted aggregates per region, quarter and zoom-level quadkey.
+
+    Each region is its own bbox-pruned scan; at zoom < 16 tiles are rolled up
+    by quadkey prefix, which is their parent tile.
+    """
+    scans = []
+    for name, bbox in regions.items():
+        scan = reader.scan_sql(years, quarters, bbox)
+        scans.append(f"SELECT {sql_string(name)} AS region, * FROM ({scan})")
+    return f"""
+        SELECT
+            region,
+            year,
+            quarter,
+            left(quadkey, {int(zoom)}) AS quadkey,
+            sum(tests * avg_d_kbps) / sum(tests) / 1000 AS download_mbps,
+            sum(tests * avg_u_kbps) / sum(tests) / 1000 AS upload_mbps,
+            sum(tests * avg_lat_ms) / sum(tests) AS latency_ms,
+            CAST(sum(tests) AS BIGINT) AS tests,
+            CAST(sum(devices) AS BIGINT) AS devices,
+            count(*) AS tiles
+        FROM ({' UNION ALL '.join(scans)})
+        WHERE tests > 0
+        GROUP BY ALL
+        ORDER BY region, year, quarter, quadkey
+    """
+
+def build_extracts(root: str = OOKLA_ROOT, tile_type: str = "fixed", out_dir: str = EXTRACTS_DIR,
+                   regions: Optional[Dict[str, Tuple[float, float, float, float]]] = None,
+                   zooms: Iterable[int] = DEFAULT_ZOOMS, years: Optional[Iterable[int]] = None,
+                   quarters: Optional[Iterable[int]] = None) -> List[str]:
+    """
+    Write one sorted, zstd-compressed Parquet extract per zoom level covering
+    every service region. Returns the paths written.
+    """
+    regions = regions or dict(SERVICE_REGIONS)
+    os.makedirs(out_dir, exist_ok=True)
+    reader = OoklaReader(root, tile_type, duckdb.connect())
+    paths = []
+    for zoom in zooms:
+        if not 1 <= zoom <= OOKLA_ZOOM:
+            raise ValueError(f"zoom must be between 1 and {OOKLA_ZOOM}, got {zoom}")
+        start = time.perf_counter()
+        path = extract_path(out_dir, tile_type, zoom)
+        tmp = f"{path}.tmp"
+        # Written to a temporary file and renamed, so readers never see a partial extract.
+        reader.connection.execute(
+            f"COPY ({aggregate_sql(reader, regions, zoom, years, quarters)}) TO {sql_string(tmp)} "
+            f"(FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {EXTRACT_ROW_GROUP_SIZE})"
+        )
+        os.replace(tmp, path)
+        rows = reader.connection.execute(f"SELECT count(*) FROM read_parquet({sql_string(path)})").fetchone()[0]
+        logger.info(
+            f"Wrote {rows} zoom-{zoom} rows for {len(regions)} regions to {path} "
+            f"({os.path.getsize(path) / 1024:.0f} KB, {time.perf_counter() - start:.1f}s)"
+        )
+        paths.append(path)
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build small per-region Ookla aggregate extracts.")
+    parser.add_argument("--root", default=OOKLA_ROOT, help="Root of the year=*/quarter=* Ookla tree")
+    parser.add_argument("--type", dest="tile_type", choices=TILE_TYPES, default="fixed", help="Tile type")
+    parser.add_argument("--out-dir", default=EXTRACTS_DIR, help="Directory for the <type>_z<zoom>.parquet extracts")
+    parser.add_argument("--regions-file", help="JSON file of {name: [south, west, north, east]} service regions")
+    parser.add_argument("--zooms", type=int, nargs="+", default=DEFAULT_ZOOMS, help="Quadkey zoom levels to aggregate to")
+    parser.add_argument("--years", type=int, nargs="+", help="Years to include (default: all)")
+    parser.add_argument("--quarters", type=int, nargs="+", choices=[1, 2, 3, 4], help="Quarters to include (default: all)")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    build_extracts(
+        args.root,
+        args.tile_type,
+        args.out_dir,
+        load_regions(args.regions_file),
+        args.zooms,
+        args.years,
+        args.quarters,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import glob
+import logging
+import os
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from quadkey import bbox_quadkey_ranges
+
+logger = logging.getLogger(__name__)
+
+# Constants
+# Root of the Ookla open data tree: <root>/year=YYYY/quarter=Q/<date>_performance_<type>_tiles.parquet
+OOKLA_ROOT = os.environ.get("OOKLA_ROOT", "ookla/open")
+TILE_TYPES = ("fixed", "mobile")
+DEFAULT_BATCH_ROWS = 122_880
+PERFORMANCE_COLUMNS = ["quadkey", "avg_d_kbps", "avg_u_kbps", "avg_lat_ms", "tests", "devices"]
+_PARTITION_PATTERN = re.compile(r"year=(\d{4})[\\/]+quarter=(\d)")
+
+def sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+class OoklaReader:
+    """
+    Reads the hive-partitioned Ookla open data Parquet tree through DuckDB.
+
+    Year/quarter filters select partition files before anything is opened,
+    and a bounding box becomes quadkey range predicates, which DuckDB pushes
+    into the Parquet scan so row groups whose quadkey min/max fall outside
+    the box are skipped. Results come back as lazily fetched Arrow batches.
+    """
+    def __init__(self, root: str = OOKLA_ROOT, tile_type: str = "fixed",
+                 connection: Optional[duckdb.DuckDBPyConnection] = None):
+        if tile_type not in TILE_TYPES:
+            raise ValueError(f"tile_type must be one of {TILE_TYPES}, got {tile_type!r}")
+        self.root = root
+        self.tile_type = tile_type
+        self.connection = connection or duckdb.connect()
+
+    def files(self, years: Optional[Iterable[int]] = None,
+              quarters: Optional[Iterable[int]] = None) -> List[Tuple[int, int, str]]:
+        """(year, quarter, path) of every partition file matching the filters, oldest first."""
+        years = set(years) if years is not None else None
+        quarters = set(quarters) if quarters is not None else None
+        pattern = os.path.join(self.root, "year=*", "quarter=*", f"*_performance_{self.tile_type}_tiles.parquet")
+        matches = []
+        for path in glob.glob(pattern):
+            match = _PARTITION_PATTERN.search(path)
+            if not match:
+                continue
+            year, quarter = int(match.group(1)), int(match.group(2))
+            if (years is None or year in years) and (quarters is None or quarter in quarters):
+                matches.append((year, quarter, path))
+        return sorted(matches)
+
+    def partitions(self, years: Optional[Iterable[int]] = None,
+                   quarters: Optional[Iterable[int]] = None) -> List[Tuple[int, int]]:
+        return [(year, quarter) for year, quarter, _ in self.files(years, quarters)]
+
+    def scan_sql(self, years: Optional[Iterable[int]] = None, quarters: Optional[Iterable[int]] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None,
+                 columns: Optional[Sequence[str]] = None, where: Optional[str] = None) -> str:
+        """
+        A SELECT over the matching partitions, for use on its own or as a
+        subquery (the year and quarter partition columns are always included).
+
+        Args:
+            years, quarters: Partitions to read; None means all.
+            bbox: Optional (south, west, north, east) box; only tiles
+                intersecting it are returned.
+            columns: Tile columns to read (default PERFORMANCE_COLUMNS).
+            where: Extra SQL predicate.
+        """
+        files = self.files(years, quarters)
+        if not files:
+            raise FileNotFoundError(
+                f"No Ookla {self.tile_type} partitions under {self.root} for years={years} quarters={quarters}"
+            )
+        file_list = ", ".join(sql_string(path) for _, _, path in files)
+        select = ", ".join(list(columns or PERFORMANCE_COLUMNS) + ["year", "quarter"])
+        predicates = []
+        if bbox is not None:
+            predicates.append(quadkey_predicate(bbox))
+        if where:
+            predicates.append(f"({where})")
+        sql = (
+            f"SELECT {select} FROM read_parquet([{file_list}], hive_partitioning = true, "
+            f"union_by_name = true, hive_types = {{'year': INTEGER, 'quarter': INTEGER}})"
+        )
+        if predicates:
+            sql += " WHERE " + " AND ".join(predicates)
+        return sql
+
+    def batches(self, years: Optional[Iterable[int]] = None, quarters: Optional[Iterable[int]] = None,
+                bbox: Optional[Tuple[float, float, float, float]] = None,
+                columns: Optional[Sequence[str]] = None, where: Optional[str] = None,
+                batch_rows: int = DEFAULT_BATCH_ROWS) -> pa.RecordBatchReader:
+        """Stream the matching tiles as Arrow record batches; nothing is read until batches are pulled."""
+        sql = self.scan_sql(years, quarters, bbox, columns, where)
+        return arrow_reader(self.connection.execute(sql), batch_rows)
+
+    def to_arrow(self, years: Optional[Iterable[int]] = None, quarters: Optional[Iterable[int]] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None,
+                 columns: Optional[Sequence[str]] = None, where: Optional[str] = None) -> pa.Table:
+        """Materialize the matching tiles as one Arrow table (for small, filtered reads)."""
+        return self.batches(years, quarters, bbox, columns, where).read_all()
+
+def arrow_reader(result: duckdb.DuckDBPyConnection, batch_rows: int = DEFAULT_BATCH_ROWS) -> pa.RecordBatchReader:
+    """Arrow batch reader over the result of connection.execute()."""
+    # to_arrow_reader replaced fetch_record_batch in newer DuckDB releases.
+    if hasattr(result, "to_arrow_reader"):
+        return result.to_arrow_reader(batch_rows)
+    return result.fetch_record_batch(batch_rows)
+
+def quadkey_predicate(bbox: Tuple[float, float, float, float]) -> str:
+    """
+    SQL predicate selecting the zoom-16 quadkeys of tiles intersecting bbox.
+
+    The overall [first, last) range comes first as its own conjunct, so it is
+    pushed into the Parquet scan as a simple min/max filter even where the
+    disjunction of exact ranges isn't.
+    """
+    ranges = bbox_quadkey_ranges(bbox)
+    low = ranges[0][0]
+    high = ranges[-1][1]
+    clauses = []
+    for start, end in ranges:
+        clause = f"quadkey >= {sql_string(start)}"
+        if end is not None:
+            clause += f" AND quadkey < {sql_string(end)}"
+        clauses.append(f"({clause})")
+    outer = f"quadkey >= {sql_string(low)}"
+    if high is not None:
+        outer += f" AND quadkey < {sql_string(high)}"
+    return f"{outer} AND ({' OR '.join(clauses)})"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Summarise Ookla open data tiles for a region and time range.")
+    parser.add_argument("--root", default=OOKLA_ROOT, help="Root of the year=*/quarter=* Ookla tree")
+    parser.add_argument("--type", dest="tile_type", choices=TILE_TYPES, default="fixed", help="Tile type")
+    parser.add_argument("--years", type=int, nargs="+", help="Years to read (default: all)")
+    parser.add_argument("--quarters", type=int, nargs="+", choices=[1, 2, 3, 4], help="Quarters to read (default: all)")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        help="Only tiles intersecting this bounding box")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    reader = OoklaReader(args.root, args.tile_type)
+    rows = tests = 0
+    for batch in reader.batches(args.years, args.quarters, args.bbox, columns=["quadkey", "tests"]):
+        rows += batch.num_rows
+        tests += pc.sum(batch.column("tests")).as_py() or 0
+    partitions = reader.partitions(args.years, args.quarters)
+    logger.info(f"{rows} tiles ({tests} tests) across {len(partitions)} partitions: {partitions}")
+
+if __name__ == "__main__":
+    main()
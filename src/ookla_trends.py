@@ -0,0 +1,316 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ookla_extracts import load_regions
+from ookla_reader import OOKLA_ROOT, TILE_TYPES, OoklaReader, arrow_reader, sql_string
+from place_connectivity import DEFAULT_NEIGHBOR_RADIUS, PLACES_DATA_FILE, load_places_db, load_places_json, place_tiles, places_bbox
+from place_store import atomic_open
+from quadkey import to_quadkeys
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TRENDS_CACHE_DIR = "ookla/trends_cache"
+# Region and place aggregates are cached separately, so a changed place set
+# never invalidates the region series.
+REGION_CACHE_NAME = "regions"
+PLACE_CACHE_NAME = "places"
+CACHE_MANIFEST_NAME = "manifest.json"
+TRENDS_FILE = "ookla_trends.parquet"
+# Region series (small) for the website, e.g. "connectivity improved 40% since last year".
+REGION_TRENDS_FILE = "ookla_region_trends.json"
+
+# Per-quarter aggregates computed from each partition and cached.
+QUARTER_COLUMNS = """
+    sum(weight * avg_d_kbps) / sum(weight) / 1000 AS download_mbps,
+    sum(weight * avg_u_kbps) / sum(weight) / 1000 AS upload_mbps,
+    quantile_cont(avg_lat_ms, 0.5) AS latency_p50_ms,
+    CAST(sum(tests) AS BIGINT) AS tests,
+    CAST(sum(devices) AS BIGINT) AS devices,
+    count(*) AS tiles
+"""
+TILE_COLUMNS = ["quadkey", "avg_d_kbps", "avg_u_kbps", "avg_lat_ms", "tests", "devices"]
+
+def fingerprint(*parts) -> str:
+    """Hash of the inputs a cached partition depends on besides the source file."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def source_signature(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+def place_keys(place_ids: np.ndarray, lat: np.ndarray, lng: np.ndarray, radius: int) -> pa.Table:
+    """
+    (place_id, tiles_key) for each place, where tiles_key identifies the
+    tiles its aggregates are computed from: its own tile and the radius. A
+    place only needs recomputing when its tiles_key changes.
+    """
+    own = to_quadkeys(lat, lng)
+    return pa.table({
+        "place_id": pa.array(place_ids.tolist(), pa.string()),
+        "tiles_key": pa.array([f"{quadkey}/{radius}" for quadkey in own.tolist()], pa.string()),
+    })
+
+def region_aggregates(reader: OoklaReader, year: int, quarter: int,
+                      regions: Dict[str, Tuple[float, float, float, float]]) -> pa.Table:
+    """Test-weighted aggregates per region for one partition."""
+    queries = []
+    for name, region_bbox in regions.items():
+        scan = reader.scan_sql([year], [quarter], region_bbox, columns=TILE_COLUMNS)
+        queries.append(
+            f"SELECT 'region' AS scope, {sql_string(name)} AS key, year, quarter, {QUARTER_COLUMNS} "
+            f"FROM (SELECT *, tests AS weight FROM ({scan})) WHERE tests > 0 GROUP BY year, quarter"
+        )
+    return arrow_reader(reader.connection.execute(" UNION ALL ".join(queries))).read_all()
+
+def place_aggregates(reader: OoklaReader, year: int, quarter: int, place_ids: np.ndarray, lat: np.ndarray,
+                     lng: np.ndarray, radius: int, keys: pa.Table) -> pa.Table:
+    """
+    Aggregates for one partition per place, weighted by tests and ring as in
+    place_connectivity. Every place gets a row, with NULL metrics where no
+    tile matched, so the cache also remembers which places had no data.
+    """
+    connection = reader.connection
+    connection.register("place_tiles", place_tiles(place_ids, lat, lng, radius))
+    connection.register("place_keys", keys)
+    scan = reader.scan_sql([year], [quarter], places_bbox(lat, lng, radius), columns=TILE_COLUMNS)
+    try:
+        return arrow_reader(connection.execute(
+            f"""
+            WITH matched AS (
+                SELECT p.place_id, o.*, o.tests * pow(0.5, p.ring) AS weight
+                FROM place_tiles p JOIN ({scan}) o USING (quadkey)
+                WHERE o.tests > 0
+            ),
+            aggregates AS (
+                SELECT place_id, {QUARTER_COLUMNS} FROM matched GROUP BY place_id
+            )
+            SELECT 'place' AS scope, k.place_id AS key, {int(year)} AS year, {int(quarter)} AS quarter,
+                   a.* EXCLUDE (place_id), k.tiles_key
+            FROM place_keys k LEFT JOIN aggregates a USING (place_id)
+            """
+        )).read_all()
+    finally:
+        connection.unregister("place_tiles")
+        connection.unregister("place_keys")
+
+def load_manifest(cache_dir: str) -> Dict:
+    path = os.path.join(cache_dir, CACHE_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def refresh_region_cache(reader: OoklaReader, cache_dir: str, regions: Dict[str, Tuple[float, float, float, float]],
+                         manifest: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Recompute region aggregates for partitions that are new, whose source
+    file changed, or that were computed for different regions. Returns the
+    new manifest entries and the cached files in quarter order.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    regions_key = fingerprint(regions)
+    entries = {}
+    processed = 0
+    for year, quarter, source in reader.files():
+        name = f"{reader.tile_type}_{year}_Q{quarter}"
+        cache_file = os.path.join(cache_dir, f"{name}.parquet")
+        entry = {"source": source, "signature": source_signature(source), "regions": regions_key}
+        if manifest.get(name) != entry or not os.path.exists(cache_file):
+            start = time.perf_counter()
+            table = region_aggregates(reader, year, quarter, regions)
+            pq.write_table(table, cache_file, compression="zstd")
+            processed += 1
+            logger.info(f"Aggregated {len(regions)} regions for {year} Q{quarter} in {time.perf_counter() - start:.1f}s")
+        entries[name] = entry
+    logger.info(f"Region aggregates: processed {processed} of {len(entries)} partitions")
+    return entries, [os.path.join(cache_dir, f"{name}.parquet") for name in sorted(entries)]
+
+def refresh_place_cache(reader: OoklaReader, cache_dir: str, place_ids: np.ndarray, lat: np.ndarray,
+                        lng: np.ndarray, radius: int, manifest: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Bring the per-partition place aggregates up to date. For a partition
+    whose source file is unchanged, cached rows are kept for places whose
+    tiles_key still matches and only added or moved places are computed;
+    removed places are dropped. A new or changed partition is computed for
+    every place.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    keys = place_keys(place_ids, lat, lng, radius)
+    current = dict(zip(keys.column("place_id").to_pylist(), keys.column("tiles_key").to_pylist()))
+    entries = {}
+    partitions = computed = 0
+    for year, quarter, source in reader.files():
+        name = f"{reader.tile_type}_{year}_Q{quarter}"
+        cache_file = os.path.join(cache_dir, f"{name}.parquet")
+        entry = {"source": source, "signature": source_signature(source)}
+        entries[name] = entry
+
+        cached = None
+        if manifest.get(name) == entry and os.path.exists(cache_file):
+            cached = pq.read_table(cache_file)
+            cached_keys = zip(cached.column("key").to_pylist(), cached.column("tiles_key").to_pylist())
+            keep = np.array([current.get(key) == tiles_key for key, tiles_key in cached_keys], dtype=bool)
+            reused = set(cached.column("key").filter(pa.array(keep)).to_pylist())
+            if keep.all() and len(reused) == len(current):
+                continue
+            cached = cached.filter(pa.array(keep))
+        else:
+            reused = set()
+
+        todo = np.array([place_id not in reused for place_id in place_ids.tolist()], dtype=bool)
+        start = time.perf_counter()
+        parts = [] if cached is None else [cached]
+        if todo.any():
+            parts.append(place_aggregates(reader, year, quarter, place_ids[todo], lat[todo], lng[todo],
+                                          radius, keys.filter(pa.array(todo))))
+        table = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+        pq.write_table(table, cache_file, compression="zstd")
+        partitions += 1
+        computed += int(todo.sum())
+        logger.info(f"Aggregated {int(todo.sum())} places for {year} Q{quarter} "
+                    f"(reused {len(reused)}) in {time.perf_counter() - start:.1f}s")
+    logger.info(f"Place aggregates: updated {partitions} of {len(entries)} partitions, computing {computed} place-quarters")
+    return entries, [os.path.join(cache_dir, f"{name}.parquet") for name in sorted(entries)]
+
+def build_series(connection: duckdb.DuckDBPyConnection, cache_files: List[str]) -> pa.Table:
+    """
+    Stitch the cached quarters into series with quarter-over-quarter and
+    year-over-year changes. Deltas compare against exactly the previous
+    quarter / the same quarter a year earlier, so gaps in coverage give NULL
+    rather than a misleading comparison.
+    """
+    files = ", ".join(sql_string(path) for path in cache_files)
+    return arrow_reader(connection.execute(
+        f"""
+        WITH points AS (
+            SELECT scope, key, year, quarter, download_mbps, upload_mbps, latency_p50_ms, tests, devices, tiles,
+                   year * 4 + quarter - 1 AS quarter_index
+            FROM read_parquet([{files}], union_by_name = true)
+            -- Cached place rows without any matching tile have NULL metrics.
+            WHERE tiles IS NOT NULL
+        )
+        SELECT
+            cur.scope, cur.key, cur.year, cur.quarter,
+            cur.download_mbps, cur.upload_mbps, cur.latency_p50_ms, cur.tests, cur.devices, cur.tiles,
+            (cur.download_mbps - prev.download_mbps) / prev.download_mbps * 100 AS download_qoq_pct,
+            (cur.download_mbps - last_year.download_mbps) / last_year.download_mbps * 100 AS download_yoy_pct,
+            cur.latency_p50_ms - prev.latency_p50_ms AS latency_qoq_ms,
+            cur.latency_p50_ms - last_year.latency_p50_ms AS latency_yoy_ms,
+            cur.devices - prev.devices AS devices_qoq
+        FROM points cur
+        LEFT JOIN points prev
+            ON prev.scope = cur.scope AND prev.key = cur.key AND prev.quarter_index = cur.quarter_index - 1
+        LEFT JOIN points last_year
+            ON last_year.scope = cur.scope AND last_year.key = cur.key AND last_year.quarter_index = cur.quarter_index - 4
+        ORDER BY cur.scope, cur.key, cur.year, cur.quarter
+        """
+    )).read_all()
+
+def region_summary(series: pa.Table) -> Dict[str, List[Dict]]:
+    """Region series in a compact JSON-friendly shape."""
+    def rounded(value):
+        return None if value is None else round(value, 1)
+
+    summary: Dict[str, List[Dict]] = {}
+    for row in series.to_pylist():
+        if row['scope'] != 'region':
+            continue
+        summary.setdefault(row['key'], []).append({
+            "quarter": f"{row['year']}-Q{row['quarter']}",
+            "downloadMbps": rounded(row['download_mbps']),
+            "uploadMbps": rounded(row['upload_mbps']),
+            "latencyP50Ms": rounded(row['latency_p50_ms']),
+            "devices": row['devices'],
+            "downloadQoqPct": rounded(row['download_qoq_pct']),
+            "downloadYoyPct": rounded(row['download_yoy_pct']),
+        })
+    return summary
+
+def build_trends(root: str = OOKLA_ROOT, tile_type: str = "fixed", cache_dir: str = TRENDS_CACHE_DIR,
+                 regions_file: Optional[str] = None, places_file: Optional[str] = PLACES_DATA_FILE,
+                 db_file: Optional[str] = None, radius: int = DEFAULT_NEIGHBOR_RADIUS,
+                 trends_file: str = TRENDS_FILE, region_trends_file: Optional[str] = REGION_TRENDS_FILE) -> pa.Table:
+    """Update the partition cache and write the full series (Parquet) and region series (JSON)."""
+    regions = load_regions(regions_file)
+    reader = OoklaReader(root, tile_type, duckdb.connect())
+    cache_dir = os.path.join(cache_dir, tile_type)
+    manifest = load_manifest(cache_dir)
+
+    region_entries, cache_files = refresh_region_cache(
+        reader, os.path.join(cache_dir, REGION_CACHE_NAME), regions, manifest.get(REGION_CACHE_NAME, {})
+    )
+    if not cache_files:
+        raise FileNotFoundError(f"No Ookla {tile_type} partitions under {root}")
+    new_manifest = {REGION_CACHE_NAME: region_entries}
+
+    if db_file or places_file:
+        place_ids, lat, lng = load_places_db(db_file) if db_file else load_places_json(places_file)
+        if len(place_ids):
+            place_entries, place_files = refresh_place_cache(
+                reader, os.path.join(cache_dir, PLACE_CACHE_NAME), place_ids, lat, lng, radius,
+                manifest.get(PLACE_CACHE_NAME, {})
+            )
+            new_manifest[PLACE_CACHE_NAME] = place_entries
+            cache_files += place_files
+    # Keep the place cache's manifest on region-only runs so it stays reusable.
+    if PLACE_CACHE_NAME not in new_manifest and PLACE_CACHE_NAME in manifest:
+        new_manifest[PLACE_CACHE_NAME] = manifest[PLACE_CACHE_NAME]
+    with atomic_open(os.path.join(cache_dir, CACHE_MANIFEST_NAME)) as f:
+        json.dump(new_manifest, f, indent=2, sort_keys=True)
+
+    series = build_series(reader.connection, cache_files)
+    pq.write_table(series, trends_file, compression="zstd")
+    logger.info(f"Wrote {series.num_rows} series points to {trends_file}")
+    if region_trends_file:
+        with atomic_open(region_trends_file) as f:
+            json.dump(region_summary(series), f, indent=2)
+        logger.info(f"Wrote region trends to {region_trends_file}")
+    return series
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Quarterly Ookla connectivity trends per service region and per place.")
+    parser.add_argument("--root", default=OOKLA_ROOT, help="Root of the year=*/quarter=* Ookla tree")
+    parser.add_argument("--type", dest="tile_type", choices=TILE_TYPES, default="fixed", help="Tile type")
+    parser.add_argument("--cache-dir", default=TRENDS_CACHE_DIR, help="Per-partition aggregate cache")
+    parser.add_argument("--regions-file", help="JSON file of {name: [south, west, north, east]} service regions")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--places-file", default=PLACES_DATA_FILE, help="Google Places dump for per-place series")
+    source.add_argument("--db", help="Read place coordinates from coffee_shops in this SQLite database instead")
+    source.add_argument("--no-places", action="store_true", help="Only compute region series")
+    parser.add_argument("--radius", type=int, default=DEFAULT_NEIGHBOR_RADIUS,
+                        help="Neighbouring tiles (in each direction) included around each place's tile")
+    parser.add_argument("--out", default=TRENDS_FILE, help="Parquet file for all series")
+    parser.add_argument("--region-out", default=REGION_TRENDS_FILE, help="JSON file for the region series")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    build_trends(
+        args.root,
+        args.tile_type,
+        args.cache_dir,
+        args.regions_file,
+        None if args.no_places else args.places_file,
+        args.db,
+        args.radius,
+        args.out,
+        args.region_out,
+    )
+
+if __name__ == "__main__":
+    main()
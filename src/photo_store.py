@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Constants
+PHOTO_STORE_DIR = "places_photo_store"
+HASH_CHUNK_SIZE = 1024 * 1024
+# View files are named by the photo's position: photo_N.jpg, plus any
+# photo_N.webp written next to it by compress.py.
+VIEW_FILE_PATTERN = re.compile(r"photo_(\d+)\.[^.]+")
+
+def file_sha256(path) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(src: Path, dest: Path):
+    """Hard-link src to dest, falling back to a copy across filesystems."""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+class PhotoStore:
+    """
+    Content-addressed store for place photos.
+
+    Each distinct image is kept once under blobs/<aa>/<sha256>.jpg. An SQLite
+    index maps (place ID, photo resource name) to its blob, and records which
+    blob has been materialized at each path of the website's
+    places_images/<place name>/photo_N.jpg layout, so unchanged view files are
+    left alone (including after they have been compressed in place). It also
+    records which place owns each view directory, since places whose names
+    sanitize alike would otherwise share one.
+    """
+    def __init__(self, root=PHOTO_STORE_DIR):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.staging_dir = self.root / "staging"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS photos (
+                place_id TEXT NOT NULL,
+                photo_name TEXT NOT NULL,
+                blob TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (place_id, photo_name)
+            );
+            CREATE TABLE IF NOT EXISTS views (
+                path TEXT PRIMARY KEY,
+                blob TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dir_owners (
+                dir TEXT PRIMARY KEY,
+                place_id TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / f"{digest}.jpg"
+
+    def staging_path(self, photo_name: str) -> Path:
+        """A scratch path to download a photo to before it is added to the store."""
+        return self.staging_dir / f"{hashlib.sha1(photo_name.encode('utf-8')).hexdigest()}.jpg"
+
+    def lookup(self, place_id: str, photo_name: str) -> Optional[str]:
+        """Return the blob digest stored for a photo, or None if it must be downloaded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blob FROM photos WHERE place_id = ? AND photo_name = ?", (place_id, photo_name)
+            ).fetchone()
+        if row is None or not self.blob_path(row[0]).exists():
+            return None
+        return row[0]
+
+    def add_file(self, path, place_id: str, photo_name: str, keep_source: bool = False) -> str:
+        """
+        Add an image file to the store and map the photo to it.
+
+        The file is moved into the blob directory (or hard-linked when
+        keep_source is set); if an identical blob already exists the file is
+        simply discarded. Returns the blob digest.
+        """
+        path = Path(path)
+        digest = file_sha256(path)
+        blob = self.blob_path(digest)
+        if blob.exists():
+            if not keep_source:
+                path.unlink()
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            if keep_source:
+                link_or_copy(path, blob)
+            else:
+                os.replace(path, blob)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO photos (place_id, photo_name, blob, added_at) VALUES (?, ?, ?, ?)",
+                (place_id, photo_name, digest, time.time()),
+            )
+            self._conn.commit()
+        return digest
+
+    def adopt(self, path, place_id: str, photo_name: str) -> str:
+        """Register an existing view file (harvested before the store existed) as-is."""
+        digest = self.add_file(path, place_id, photo_name, keep_source=True)
+        self._record_view(path, digest)
+        return digest
+
+    def _record_view(self, path, digest: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO views (path, blob) VALUES (?, ?)", (Path(path).as_posix(), digest)
+            )
+            self._conn.commit()
+
+    def materialize(self, digest: str, dest) -> bool:
+        """
+        Make dest show the given blob, unless it already does.
+
+        Returns:
+            bool: True if dest was (re)written, False if it was already current.
+        """
+        dest = Path(dest)
+        with self._lock:
+            row = self._conn.execute("SELECT blob FROM views WHERE path = ?", (dest.as_posix(),)).fetchone()
+        if row is not None and row[0] == digest and dest.exists():
+            return False
+
+        tmp = dest.with_name(f".{dest.name}.tmp")
+        tmp.unlink(missing_ok=True)
+        link_or_copy(self.blob_path(digest), tmp)
+        os.replace(tmp, dest)
+        self._record_view(dest, digest)
+        return True
+
+    def dir_owners(self) -> Dict[str, str]:
+        """The place ID that owns each view directory, keyed by directory name."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT dir, place_id FROM dir_owners"))
+
+    def set_dir_owner(self, dir_name: str, place_id: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dir_owners (dir, place_id) VALUES (?, ?)", (dir_name, place_id)
+            )
+            self._conn.commit()
+
+    def prune_views(self, place_dir, photo_count: int) -> int:
+        """
+        Delete the view files in place_dir numbered above photo_count, left over
+        from a place that had more photos (or a previous owner of the directory).
+        Returns the number of files removed.
+        """
+        stale = []
+        for path in Path(place_dir).glob("photo_*"):
+            match = VIEW_FILE_PATTERN.fullmatch(path.name)
+            if match and int(match.group(1)) > photo_count:
+                stale.append(path)
+        for path in stale:
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._conn.executemany("DELETE FROM views WHERE path = ?", [(path.as_posix(),) for path in stale])
+            self._conn.commit()
+        return len(stale)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import logging
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ookla_reader import OOKLA_ROOT, TILE_TYPES, OoklaReader, arrow_reader
+from place_store import atomic_open
+from quadkey import OOKLA_ZOOM, neighbor_quadkeys
+
+logger = logging.getLogger(__name__)
+
+# Constants
+PLACES_DATA_FILE = "places_data.json"
+# Latest-quarter baseline per place, read by tools/transform_places.py --connectivity.
+CONNECTIVITY_FILE = "place_connectivity.json"
+# Every quarter's baseline per place.
+BASELINES_FILE = "place_baselines.parquet"
+# Tiles within this many tiles of a place's own tile (1 = the 3x3 block,
+# roughly 1.8km across at zoom 16) contribute to its baseline.
+DEFAULT_NEIGHBOR_RADIUS = 1
+
+def load_places_json(path: str = PLACES_DATA_FILE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(place IDs, latitudes, longitudes) of the places in a Google Places dump."""
+    with open(path, 'r', encoding='utf-8') as f:
+        places = [p for p in json.load(f) if p.get('location')]
+    return (
+        np.array([p['id'] for p in places], dtype=object),
+        np.array([p['location']['latitude'] for p in places], dtype=np.float64),
+        np.array([p['location']['longitude'] for p in places], dtype=np.float64),
+    )
+
+def load_places_db(db_file: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The same from coffee_shops, keyed by google_places_id where there is one
+    (so results line up with places_data.json) and by the row id otherwise.
+    """
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(
+        """
+        SELECT COALESCE(google_places_id, CAST(id AS TEXT)), CAST(latitude AS REAL), CAST(longitude AS REAL)
+        FROM coffee_shops WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """
+    ).fetchall()
+    conn.close()
+    ids, lat, lng = zip(*rows) if rows else ((), (), ())
+    return np.array(ids, dtype=object), np.array(lat, dtype=np.float64), np.array(lng, dtype=np.float64)
+
+def place_tiles(place_ids: np.ndarray, lat: np.ndarray, lng: np.ndarray,
+                radius: int = DEFAULT_NEIGHBOR_RADIUS) -> pa.Table:
+    """
+    One row per (place, nearby tile): the quadkeys of each place's tile and
+    its neighbours, with ring = the tile's Chebyshev distance from the place's
+    own tile.
+    """
+    quadkeys = neighbor_quadkeys(lat, lng, radius)
+    offsets = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(offsets, offsets, indexing="xy")
+    rings = np.maximum(np.abs(dx), np.abs(dy)).ravel()
+    per_place = quadkeys.shape[1]
+    return pa.table({
+        "place_id": pa.array(np.repeat(place_ids, per_place).tolist(), pa.string()),
+        "quadkey": pa.array(quadkeys.ravel().tolist(), pa.string()),
+        "ring": np.tile(rings, len(place_ids)).astype(np.int32),
+    })
+
+def places_bbox(lat: np.ndarray, lng: np.ndarray, radius: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) around all places, padded to include their neighbour tiles."""
+    pad = (radius + 1) * 360.0 / (1 << OOKLA_ZOOM)
+    return float(lat.min() - pad), float(lng.min() - pad), float(lat.max() + pad), float(lng.max() + pad)
+
+def compute_baselines(reader: OoklaReader, tiles: pa.Table, bbox: Tuple[float, float, float, float],
+                      years: Optional[Iterable[int]] = None,
+                      quarters: Optional[Iterable[int]] = None) -> pa.Table:
+    """
+    Hash-join the place/tile pairs with the Ookla tiles on quadkey and
+    aggregate per place and quarter.
+
+    Speeds and latency are averaged weighted by each tile's test count,
+    halved for each ring away from the place's own tile, so the place's tile
+    dominates when it has data and neighbours fill in when it doesn't.
+    """
+    connection = reader.connection
+    connection.register("place_tiles", tiles)
+    scan = reader.scan_sql(years, quarters, bbox, columns=["quadkey", "avg_d_kbps", "avg_u_kbps", "avg_lat_ms", "tests", "devices"])
+    try:
+        return arrow_reader(connection.execute(
+            f"""
+            WITH ookla AS ({scan}),
+            matched AS (
+                SELECT p.place_id, p.ring, o.*, o.tests * pow(0.5, p.ring) AS weight
+                FROM place_tiles p JOIN ookla o USING (quadkey)
+            )
+            SELECT
+                place_id,
+                year,
+                quarter,
+                sum(weight * avg_d_kbps) / sum(weight) / 1000 AS download_mbps,
+                sum(weight * avg_u_kbps) / sum(weight) / 1000 AS upload_mbps,
+                sum(weight * avg_lat_ms) / sum(weight) AS latency_ms,
+                CAST(sum(tests) AS BIGINT) AS tests,
+                CAST(sum(devices) AS BIGINT) AS devices,
+                count(*) AS tiles,
+                bool_or(ring = 0) AS has_own_tile
+            FROM matched
+            GROUP BY place_id, year, quarter
+            ORDER BY place_id, year, quarter
+            """
+        )).read_all()
+    finally:
+        connection.unregister("place_tiles")
+
+def latest_baselines(baselines: pa.Table) -> Dict[str, Dict]:
+    """The most recent quarter's baseline for each place, in the shape written to CONNECTIVITY_FILE."""
+    latest = {}
+    for row in baselines.to_pylist():
+        # Rows are ordered by place, year, quarter, so the last one wins.
+        latest[row['place_id']] = {
+            "quarter": f"{row['year']}-Q{row['quarter']}",
+            "downloadMbps": round(row['download_mbps'], 1),
+            "uploadMbps": round(row['upload_mbps'], 1),
+            "latencyMs": round(row['latency_ms'], 1),
+            "tests": int(row['tests']),
+            "tiles": int(row['tiles']),
+        }
+    return latest
+
+def build_connectivity(places_file: Optional[str] = PLACES_DATA_FILE, db_file: Optional[str] = None,
+                       root: str = OOKLA_ROOT, tile_type: str = "fixed",
+                       years: Optional[Iterable[int]] = None, quarters: Optional[Iterable[int]] = None,
+                       radius: int = DEFAULT_NEIGHBOR_RADIUS, baselines_file: Optional[str] = BASELINES_FILE,
+                       connectivity_file: Optional[str] = CONNECTIVITY_FILE) -> pa.Table:
+    """Compute per-place Ookla baselines and write the Parquet/JSON outputs."""
+    place_ids, lat, lng = load_places_db(db_file) if db_file else load_places_json(places_file)
+    if not len(place_ids):
+        raise ValueError("No places with coordinates to join")
+    logger.info(f"Joining {len(place_ids)} places against Ookla {tile_type} tiles (radius {radius})")
+
+    reader = OoklaReader(root, tile_type, duckdb.connect())
+    baselines = compute_baselines(reader, place_tiles(place_ids, lat, lng, radius),
+                                  places_bbox(lat, lng, radius), years, quarters)
+
+    if baselines_file:
+        pq.write_table(baselines, baselines_file, compression="zstd")
+        logger.info(f"Wrote {baselines.num_rows} place-quarter baselines to {baselines_file}")
+    if connectivity_file:
+        latest = latest_baselines(baselines)
+        with atomic_open(connectivity_file) as f:
+            json.dump(latest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        logger.info(f"Wrote latest baselines for {len(latest)}/{len(place_ids)} places to {connectivity_file}")
+    return baselines
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Join places to Ookla tiles by quadkey for per-place connectivity baselines.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--places-file", default=PLACES_DATA_FILE, help="Google Places dump to read coordinates from")
+    source.add_argument("--db", help="Read coordinates from coffee_shops in this SQLite database instead")
+    parser.add_argument("--root", default=OOKLA_ROOT, help="Root of the year=*/quarter=* Ookla tree")
+    parser.add_argument("--type", dest="tile_type", choices=TILE_TYPES, default="fixed", help="Tile type")
+    parser.add_argument("--years", type=int, nargs="+", help="Years to join (default: all)")
+    parser.add_argument("--quarters", type=int, nargs="+", choices=[1, 2, 3, 4], help="Quarters to join (default: all)")
+    parser.add_argument("--radius", type=int, default=DEFAULT_NEIGHBOR_RADIUS,
+                        help="Neighbouring tiles (in each direction) included around each place's tile")
+    parser.add_argument("--baselines-out", default=BASELINES_FILE, help="Parquet file for every quarter's baselines")
+    parser.add_argument("--connectivity-out", default=CONNECTIVITY_FILE,
+                        help="JSON file of each place's latest baseline (for transform_places.py --connectivity)")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    build_connectivity(
+        args.places_file,
+        args.db,
+        args.root,
+        args.tile_type,
+        args.years,
+        args.quarters,
+        args.radius,
+        args.baselines_out,
+        args.connectivity_out,
+    )
+
+if __name__ == "__main__":
+    main()
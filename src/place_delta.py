@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from place_store import atomic_open
+
+logger = logging.getLogger(__name__)
+
+# Constants
+CHANGES_FILE = "places_changes.json"
+# Downstream steps that read the change file. Each has its own pending change
+# set, which accumulates across harvests until that step has applied it, so a
+# step that skips a run doesn't lose the changes from it.
+CONSUMERS = ("transform_places", "load_init_db", "compress", "compress_variants")
+
+def photo_names(place: Dict) -> List[str]:
+    """The photo resource names of a place, in the order the API returned them."""
+    return [photo['name'] for photo in place.get('photos', []) if photo.get('name')]
+
+# Fields compared between harvests. Photos are compared by resource name only,
+# since their attribution/size metadata can change without the image changing.
+TRACKED_FIELDS = {
+    "displayName": lambda place: place.get('displayName'),
+    "formattedAddress": lambda place: place.get('formattedAddress'),
+    "location": lambda place: place.get('location'),
+    "rating": lambda place: place.get('rating'),
+    "userRatingCount": lambda place: place.get('userRatingCount'),
+    "businessStatus": lambda place: place.get('businessStatus'),
+    "regularOpeningHours": lambda place: (place.get('regularOpeningHours') or {}).get('periods'),
+    "photos": photo_names,
+}
+
+def field_hashes(place: Dict) -> Dict[str, str]:
+    """Hash each tracked field of a place independently."""
+    hashes = {}
+    for field, extract in TRACKED_FIELDS.items():
+        canonical = json.dumps(extract(place), sort_keys=True, ensure_ascii=False)
+        hashes[field] = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+    return hashes
+
+def compute_changes(previous: Dict[str, Dict], fresh: Iterable[Dict],
+                    known_ids: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Compare freshly harvested places against the stored snapshot.
+
+    Args:
+        previous (Dict[str, Dict]): Stored records for (at least) the fresh place IDs.
+        fresh (Iterable[Dict]): Places returned by this harvest.
+        known_ids (Iterable[str]): Every ID in the store. When given, stored places
+            missing from this harvest are reported as removed; leave it out for
+            partial sweeps that don't cover the whole stored area.
+
+    Returns:
+        Dict: A change set with the IDs of added, removed and changed places,
+        the tracked fields that changed per place, and the photo resource names
+        that are new per place.
+    """
+    added: List[str] = []
+    changed: Dict[str, List[str]] = {}
+    new_photos: Dict[str, List[str]] = {}
+    fresh_ids = set()
+
+    for place in fresh:
+        place_id = place['id']
+        fresh_ids.add(place_id)
+        old = previous.get(place_id)
+        if old is None:
+            added.append(place_id)
+            if photo_names(place):
+                new_photos[place_id] = photo_names(place)
+            continue
+
+        old_hashes = field_hashes(old)
+        new_hashes = field_hashes(place)
+        fields = [field for field in TRACKED_FIELDS if old_hashes[field] != new_hashes[field]]
+        if fields:
+            changed[place_id] = fields
+        if "photos" in fields:
+            old_names = set(photo_names(old))
+            names = [name for name in photo_names(place) if name not in old_names]
+            if names:
+                new_photos[place_id] = names
+
+    removed = sorted(set(known_ids) - fresh_ids) if known_ids is not None else []
+
+    return {
+        "generatedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "newPhotos": new_photos,
+        # Image files (relative to the images directory) written by this harvest;
+        # filled in by the harvester once photos have been materialized.
+        "photoFiles": [],
+    }
+
+def merge_changes(pending: Optional[Dict], changes: Dict) -> Dict:
+    """
+    Fold a newer change set into one that hasn't been consumed yet.
+
+    A place removed later is dropped from added/changed; a place added again
+    after being removed is no longer removed. Changed fields, new photos and
+    photo files are unions.
+    """
+    if not pending:
+        return changes
+    added = dict.fromkeys(pending['added'])
+    removed = set(pending['removed'])
+    changed = {place_id: list(fields) for place_id, fields in pending['changed'].items()}
+    new_photos = {place_id: list(names) for place_id, names in pending['newPhotos'].items()}
+
+    for place_id in changes['removed']:
+        added.pop(place_id, None)
+        changed.pop(place_id, None)
+        new_photos.pop(place_id, None)
+        removed.add(place_id)
+    for place_id in changes['added']:
+        removed.discard(place_id)
+        changed.pop(place_id, None)
+        added[place_id] = None
+    for place_id, fields in changes['changed'].items():
+        if place_id not in added:
+            changed[place_id] = list(dict.fromkeys(changed.get(place_id, []) + fields))
+    for place_id, names in changes['newPhotos'].items():
+        new_photos[place_id] = list(dict.fromkeys(new_photos.get(place_id, []) + names))
+
+    return dict(
+        changes,
+        added=list(added),
+        removed=sorted(removed),
+        changed=changed,
+        newPhotos=new_photos,
+        photoFiles=sorted(set(pending['photoFiles']) | set(changes['photoFiles'])),
+    )
+
+def load_change_file(filename: str = CHANGES_FILE) -> Dict:
+    """
+    Read the change file, or an empty one if it is missing or unreadable.
+    A bare change set written before pending sets were kept counts as pending
+    for every consumer.
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"sequence": 0, "pending": {}}
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"Ignoring unreadable change file {filename}: {e}")
+        return {"sequence": 0, "pending": {}}
+    if "pending" not in data:
+        return {"sequence": 0, "pending": {consumer: data for consumer in CONSUMERS}}
+    return data
+
+def write_changes(changes: Dict, filename: str = CHANGES_FILE):
+    """Fold a change set into every consumer's pending set and write the change file atomically."""
+    data = load_change_file(filename)
+    sequence = data["sequence"] + 1
+    changes = dict(changes, sequence=sequence)
+    pending = {consumer: merge_changes(data["pending"].get(consumer), changes) for consumer in CONSUMERS}
+    with atomic_open(filename) as f:
+        json.dump({"sequence": sequence, "pending": pending}, f, ensure_ascii=False, indent=2)
+    logger.info(
+        f"Wrote change set to {filename}: {len(changes['added'])} added, "
+        f"{len(changes['removed'])} removed, {len(changes['changed'])} changed, "
+        f"{len(changes['photoFiles'])} photo files"
+    )
+
+def pending_changes(consumer: str, filename: str = CHANGES_FILE) -> Dict:
+    """The changes a consumer hasn't applied yet (an empty change set if there are none)."""
+    pending = load_change_file(filename)["pending"].get(consumer)
+    return pending or {"added": [], "removed": [], "changed": {}, "newPhotos": {}, "photoFiles": []}
+
+def mark_consumed(consumer: str, changes: Dict, filename: str = CHANGES_FILE):
+    """
+    Clear a consumer's pending set once it has applied changes. If a harvest
+    has folded more changes in since they were read, the set is left alone;
+    applying it again later only redoes work.
+    """
+    data = load_change_file(filename)
+    pending = data["pending"].get(consumer)
+    if not pending or "sequence" not in changes or pending.get("sequence") != changes["sequence"]:
+        return
+    data["pending"][consumer] = None
+    with atomic_open(filename) as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
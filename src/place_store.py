@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Constants
+STORE_FILE = "places_data.db"
+# Number of IDs looked up per query when diffing a batch against the store.
+LOOKUP_CHUNK_SIZE = 500
+
+def content_hash(place: Dict) -> str:
+    """Stable hash of a place record, independent of key order."""
+    canonical = json.dumps(place, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+@contextmanager
+def atomic_open(path, mode: str = "w", encoding: str = "utf-8"):
+    """
+    Open a temporary file next to path for writing and rename it over path
+    only once the block completes, so readers never see a partial file.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent or ".", prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else encoding) as f:
+            yield f
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+class PlaceStore:
+    """
+    Incremental SQLite store of Google Places records keyed by place ID.
+
+    Each record keeps a content hash so re-saving an unchanged place is a
+    no-op, and only places that are new or changed are written.
+    """
+    def __init__(self, path=STORE_FILE):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS places (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def get_hashes(self, place_ids: Iterable[str]) -> Dict[str, str]:
+        """Return the stored content hash for each of the given IDs that exists."""
+        ids = list(place_ids)
+        hashes = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            chunk = ids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT id, content_hash FROM places WHERE id IN ({placeholders})", chunk
+            )
+            hashes.update(rows)
+        return hashes
+
+    def get_many(self, place_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Return the stored record for each of the given IDs that exists."""
+        ids = list(place_ids)
+        places = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            chunk = ids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT id, data FROM places WHERE id IN ({placeholders})", chunk
+            )
+            places.update((place_id, json.loads(data)) for place_id, data in rows)
+        return places
+
+    def all_ids(self) -> List[str]:
+        return [place_id for (place_id,) in self._conn.execute("SELECT id FROM places")]
+
+    def upsert_many(self, places: Iterable[Dict]) -> Tuple[int, int, int]:
+        """
+        Insert new places and update changed ones in a single transaction.
+
+        Args:
+            places (Iterable[Dict]): Place objects with an 'id' key.
+
+        Returns:
+            Tuple[int, int, int]: Counts of (added, updated, unchanged) places.
+        """
+        batch: Dict[str, Dict] = {}
+        for place in places:
+            batch[place['id']] = place
+
+        existing = self.get_hashes(batch.keys())
+        now = time.time()
+        rows: List[Tuple[str, str, str, float]] = []
+        added = updated = 0
+        for place_id, place in batch.items():
+            digest = content_hash(place)
+            if existing.get(place_id) == digest:
+                continue
+            if place_id in existing:
+                updated += 1
+            else:
+                added += 1
+            rows.append((place_id, json.dumps(place, ensure_ascii=False), digest, now))
+
+        if rows:
+            with self._conn:
+                self._conn.executemany(
+                    """
+                    INSERT INTO places (id, data, content_hash, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        data = excluded.data,
+                        content_hash = excluded.content_hash,
+                        updated_at = excluded.updated_at
+                    """,
+                    rows,
+                )
+        return added, updated, len(batch) - added - updated
+
+    def iter_places(self) -> Iterator[Dict]:
+        """Yield every stored place in insertion order without loading them all at once."""
+        for (data,) in self._conn.execute("SELECT data FROM places ORDER BY rowid"):
+            yield json.loads(data)
+
+    def import_json(self, filename) -> Tuple[int, int, int]:
+        """Seed the store from an existing places JSON array file."""
+        with open(filename, 'r', encoding='utf-8') as f:
+            places = json.load(f)
+        return self.upsert_many(places)
+
+    def export_json(self, filename) -> int:
+        """
+        Atomically write every stored place to a JSON array file, formatted
+        the same way the original places_data.json was. Returns the count.
+        """
+        count = 0
+        with atomic_open(filename) as f:
+            f.write("[")
+            for place in self.iter_places():
+                item = json.dumps(place, ensure_ascii=False, indent=2)
+                f.write(",\n" if count else "\n")
+                f.write("\n".join("  " + line for line in item.splitlines()))
+                count += 1
+            f.write("\n]" if count else "]")
+        return count
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Constants
+CACHE_FILE = "places_cache.db"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of Places API responses.
+
+    Entries are keyed by the request payload (query text, page token, location
+    restriction, ...) together with the X-Goog-FieldMask, so asking for a
+    different set of fields never returns a response that lacks them.
+    """
+    def __init__(self, path: str = CACHE_FILE, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # The client searches from a thread pool, so the connection is shared
+        # behind a lock rather than bound to the creating thread.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                field_mask TEXT NOT NULL,
+                request TEXT NOT NULL,
+                response TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(payload: Dict, field_mask: str) -> str:
+        """Stable hash of a request payload and field mask."""
+        canonical = json.dumps({"payload": payload, "fieldMask": field_mask}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, payload: Dict, field_mask: str, allow_stale: bool = False) -> Optional[Dict]:
+        """
+        Look up a cached response.
+
+        Args:
+            payload (Dict): The JSON body of the request.
+            field_mask (str): The X-Goog-FieldMask sent with the request.
+            allow_stale (bool): Return the entry even if it is older than the TTL.
+
+        Returns:
+            Dict: The cached response body, or None on a miss.
+        """
+        key = self.make_key(payload, field_mask)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, fetched_at = row
+        if not allow_stale and self.ttl_seconds is not None and time.time() - fetched_at > self.ttl_seconds:
+            return None
+        return json.loads(response)
+
+    def put(self, payload: Dict, field_mask: str, response: Dict):
+        """Store (or refresh) the response for a request."""
+        key = self.make_key(payload, field_mask)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, field_mask, request, response, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    field_mask,
+                    json.dumps(payload, sort_keys=True, ensure_ascii=False),
+                    json.dumps(response, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete entries older than the TTL. Returns the number removed."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Purged {cursor.rowcount} expired cache entries from {self.path}")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
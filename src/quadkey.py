@@ -0,0 +1,119 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+# Ookla open-data performance tiles are zoom-16 Web Mercator tiles.
+OOKLA_ZOOM = 16
+MAX_LATITUDE = 85.05112878
+
+def tile_xy(lat, lng, zoom: int = OOKLA_ZOOM):
+    """
+    Web Mercator tile column/row containing each point (scalars or NumPy arrays).
+    Row 0 is the northernmost row, as in Bing/Ookla quadkeys.
+    """
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lng = np.asarray(lng, dtype=np.float64)
+    n = 1 << zoom
+    sin_lat = np.sin(np.radians(lat))
+    x = (lng + 180.0) / 360.0 * n
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * n
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+def tile_to_quadkeys(x, y, zoom: int = OOKLA_ZOOM) -> np.ndarray:
+    """Quadkey strings for arrays of tile columns/rows, built with bit arithmetic rather than per-tile loops."""
+    x = np.atleast_1d(np.asarray(x, dtype=np.int64))
+    y = np.atleast_1d(np.asarray(y, dtype=np.int64))
+    shifts = np.arange(zoom - 1, -1, -1)
+    digits = ((x[:, None] >> shifts) & 1) | (((y[:, None] >> shifts) & 1) << 1)
+    chars = (digits + ord("0")).astype(np.uint8)
+    return np.ascontiguousarray(chars).view(f"S{zoom}").ravel().astype(str)
+
+def to_quadkeys(lat, lng, zoom: int = OOKLA_ZOOM) -> np.ndarray:
+    """Quadkeys of the tiles containing each point."""
+    return tile_to_quadkeys(*tile_xy(lat, lng, zoom), zoom)
+
+def quadkey_to_tile(quadkey: str) -> Tuple[int, int, int]:
+    """Return (x, y, zoom) for a quadkey."""
+    x = y = 0
+    for digit in quadkey:
+        value = int(digit)
+        x = (x << 1) | (value & 1)
+        y = (y << 1) | (value >> 1)
+    return x, y, len(quadkey)
+
+def tile_bounds(x: int, y: int, zoom: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a tile."""
+    n = 1 << zoom
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+def neighbor_quadkeys(lat, lng, radius: int = 1, zoom: int = OOKLA_ZOOM) -> np.ndarray:
+    """
+    Quadkeys of the (2 * radius + 1)^2 block of tiles centred on each point's
+    tile, as an array of shape (points, (2 * radius + 1) ** 2). Column
+    (2 * radius + 1) ** 2 // 2 is the point's own tile.
+    """
+    x, y = tile_xy(np.atleast_1d(lat), np.atleast_1d(lng), zoom)
+    offsets = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(offsets, offsets, indexing="xy")
+    n = 1 << zoom
+    xs = (x[:, None] + dx.ravel()) % n
+    ys = np.clip(y[:, None] + dy.ravel(), 0, n - 1)
+    return tile_to_quadkeys(xs.ravel(), ys.ravel(), zoom).reshape(len(x), -1)
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Smallest string greater than every quadkey starting with prefix, with
+    the base-4 carry normalised so adjacent ranges compare equal ("0123" ->
+    "013"). None means unbounded.
+    """
+    stripped = prefix.rstrip("3")
+    if not stripped:
+        return None
+    return stripped[:-1] + str(int(stripped[-1]) + 1)
+
+def bbox_quadkey_ranges(bbox: Tuple[float, float, float, float],
+                        zoom: int = OOKLA_ZOOM) -> List[Tuple[str, Optional[str]]]:
+    """
+    Cover a (south, west, north, east) box with quadkey ranges [low, high).
+
+    The quadtree is descended from the root: cells entirely inside the box
+    become one prefix range, and only cells on the boundary are split, down
+    to zoom-level tiles. Adjacent ranges are merged. A quadkey of length
+    zoom falls in one of the ranges exactly when its tile intersects the box,
+    and because quadkeys sort in quadtree order the ranges are plain string
+    comparisons that Parquet min/max statistics can prune on.
+    """
+    south, west, north, east = bbox
+    x0, y0 = (int(v) for v in tile_xy(north, west, zoom))
+    x1, y1 = (int(v) for v in tile_xy(south, east, zoom))
+
+    prefixes: List[str] = []
+
+    def visit(prefix: str, cx: int, cy: int, level: int):
+        shift = zoom - level
+        left, right = cx << shift, ((cx + 1) << shift) - 1
+        top, bottom = cy << shift, ((cy + 1) << shift) - 1
+        if right < x0 or left > x1 or bottom < y0 or top > y1:
+            return
+        if level == zoom or (left >= x0 and right <= x1 and top >= y0 and bottom <= y1):
+            prefixes.append(prefix)
+            return
+        for digit in range(4):
+            visit(prefix + str(digit), (cx << 1) | (digit & 1), (cy << 1) | (digit >> 1), level + 1)
+
+    visit("", 0, 0, 0)
+
+    ranges: List[Tuple[str, Optional[str]]] = []
+    for prefix in prefixes:
+        high = prefix_upper_bound(prefix)
+        if ranges and ranges[-1][1] == prefix.rstrip("0") and ranges[-1][1] is not None:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((prefix, high))
+    return ranges
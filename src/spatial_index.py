@@ -0,0 +1,371 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from place_store import atomic_open
+from quadkey import tile_xy
+
+logger = logging.getLogger(__name__)
+
+# Constants
+# Output of tools/transform_places.py: records with id, wifiSpeed and coordinates.
+GENERATED_PLACES_FILE = "website/client/src/lib/generated_places.json"
+INDEX_FILE = "spatial_index.npz"
+NEIGHBORS_FILE = "place_neighbors.json"
+EARTH_RADIUS_KM = 6371.0088
+# Grid cells are Web Mercator tiles; zoom 12 cells are ~10km across at the
+# equator (~8km in the Western Cape).
+DEFAULT_GRID_ZOOM = 12
+DEFAULT_NEIGHBORS = 5
+# Upserted rows are appended unsorted and scanned linearly until there are
+# more than this many (or DELTA_FRACTION of the sorted rows), then the index
+# is compacted back into grid order.
+MIN_DELTA_ROWS = 1024
+DELTA_FRACTION = 0.05
+
+def haversine_km(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def radius_bbox(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) enclosing a circle; west > east when it crosses the antimeridian."""
+    angle = radius_km / EARTH_RADIUS_KM
+    south = lat - math.degrees(angle)
+    north = lat + math.degrees(angle)
+    if south <= -90 or north >= 90 or angle >= math.pi / 2:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+    spread = math.degrees(math.asin(ratio))
+    west = (lng - spread + 180.0) % 360.0 - 180.0
+    east = (lng + spread + 180.0) % 360.0 - 180.0
+    return south, west, north, east
+
+class SpatialIndex:
+    """
+    In-memory grid index over place coordinates for nearest, radius and
+    bounding-box queries.
+
+    Rows are kept sorted by grid cell (x << zoom | y of the cell's tile), so
+    the cells under a box are one contiguous slice per tile column, found
+    with searchsorted; the candidates are then filtered by exact haversine
+    distance in one vectorized pass. Changes are applied incrementally:
+    replaced or removed rows are tombstoned and new rows appended to a small
+    unsorted tail, which is merged back into grid order once it grows.
+    """
+    def __init__(self, zoom: int = DEFAULT_GRID_ZOOM):
+        self.zoom = zoom
+        self.ids = np.empty(0, dtype=str)
+        self.lat = np.empty(0, dtype=np.float64)
+        self.lng = np.empty(0, dtype=np.float64)
+        # NaN where the place has no measured speed.
+        self.wifi = np.empty(0, dtype=np.float32)
+        self.cells = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        # Rows [0, indexed) are sorted by cell; the rest is the unsorted tail.
+        self.indexed = 0
+        self._rows: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, ids: Iterable[str], lat: np.ndarray, lng: np.ndarray, wifi: Optional[np.ndarray] = None,
+              zoom: int = DEFAULT_GRID_ZOOM) -> "SpatialIndex":
+        index = cls(zoom)
+        index.upsert(ids, lat, lng, wifi)
+        index.compact()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, place_id: str) -> bool:
+        return place_id in self._rows
+
+    def _cell_keys(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        x, y = tile_xy(lat, lng, self.zoom)
+        return (np.atleast_1d(x) << self.zoom) | np.atleast_1d(y)
+
+    def upsert(self, ids: Iterable[str], lat: np.ndarray, lng: np.ndarray, wifi: Optional[np.ndarray] = None):
+        """Add places, replacing any already indexed under the same ID."""
+        ids = np.asarray(list(ids), dtype=str)
+        if not len(ids):
+            return
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        wifi = np.full(len(ids), np.nan, dtype=np.float32) if wifi is None else np.asarray(wifi, dtype=np.float32)
+        self.remove(ids)
+
+        first = len(self.ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.lat = np.concatenate([self.lat, lat])
+        self.lng = np.concatenate([self.lng, lng])
+        self.wifi = np.concatenate([self.wifi, wifi])
+        self.cells = np.concatenate([self.cells, self._cell_keys(lat, lng)])
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        # A repeated ID within the batch keeps its last row.
+        for offset, place_id in enumerate(ids.tolist()):
+            previous = self._rows.get(place_id)
+            if previous is not None:
+                self.alive[previous] = False
+            self._rows[place_id] = first + offset
+
+        if len(self.ids) - self.indexed > max(MIN_DELTA_ROWS, DELTA_FRACTION * self.indexed):
+            self.compact()
+
+    def remove(self, ids: Iterable[str]) -> int:
+        """Drop places by ID; returns how many were indexed."""
+        rows = [row for row in (self._rows.pop(place_id, None) for place_id in ids) if row is not None]
+        self.alive[rows] = False
+        return len(rows)
+
+    def sync(self, ids: Iterable[str], lat: np.ndarray, lng: np.ndarray,
+             wifi: Optional[np.ndarray] = None) -> Tuple[int, int]:
+        """
+        Make the index match a full place set, touching only places that are
+        new, moved or whose speed changed, and removing those no longer
+        present. Returns (upserted, removed).
+        """
+        ids = np.asarray(list(ids), dtype=str)
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        wifi = np.full(len(ids), np.nan, dtype=np.float32) if wifi is None else np.asarray(wifi, dtype=np.float32)
+
+        rows = np.array([self._rows.get(place_id, -1) for place_id in ids.tolist()], dtype=np.int64)
+        unchanged = rows >= 0
+        if unchanged.any():
+            current = np.where(unchanged, rows, 0)
+            unchanged &= (self.lat[current] == lat) & (self.lng[current] == lng) & (
+                (self.wifi[current] == wifi) | (np.isnan(self.wifi[current]) & np.isnan(wifi))
+            )
+
+        removed = self.remove(set(self._rows) - set(ids.tolist()))
+        changed = ~unchanged
+        self.upsert(ids[changed], lat[changed], lng[changed], wifi[changed])
+        return int(changed.sum()), removed
+
+    def compact(self):
+        """Drop tombstoned rows and re-sort everything into grid order."""
+        keep = np.flatnonzero(self.alive)
+        order = keep[np.argsort(self.cells[keep], kind="stable")]
+        self.ids = self.ids[order]
+        self.lat = self.lat[order]
+        self.lng = self.lng[order]
+        self.wifi = self.wifi[order]
+        self.cells = self.cells[order]
+        self.alive = np.ones(len(order), dtype=bool)
+        self.indexed = len(order)
+        self._rows = dict(zip(self.ids.tolist(), range(len(order))))
+
+    def _candidate_rows(self, bbox: Tuple[float, float, float, float]) -> np.ndarray:
+        """Live rows in the grid cells under bbox, plus the live unsorted tail."""
+        south, west, north, east = bbox
+        if west > east:
+            spans = [(west, 180.0), (-180.0, east)]
+        else:
+            spans = [(west, east)]
+        sorted_cells = self.cells[:self.indexed]
+        parts = []
+        for span_west, span_east in spans:
+            x0, y0 = (int(v) for v in tile_xy(north, span_west, self.zoom))
+            x1, y1 = (int(v) for v in tile_xy(south, span_east, self.zoom))
+            columns = np.arange(x0, x1 + 1, dtype=np.int64) << self.zoom
+            starts = np.searchsorted(sorted_cells, columns | y0, side="left")
+            ends = np.searchsorted(sorted_cells, columns | y1, side="right")
+            parts.extend(np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start)
+        parts.append(np.arange(self.indexed, len(self.ids)))
+        rows = np.concatenate(parts)
+        return rows[self.alive[rows]]
+
+    def _filter_wifi(self, rows: np.ndarray, min_wifi: Optional[float]) -> np.ndarray:
+        if min_wifi is None:
+            return rows
+        # NaN (no measurement) never passes.
+        return rows[self.wifi[rows] >= min_wifi]
+
+    def _within_rows(self, lat: float, lng: float, radius_km: float,
+                     min_wifi: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self._filter_wifi(self._candidate_rows(radius_bbox(lat, lng, radius_km)), min_wifi)
+        distances = haversine_km(lat, lng, self.lat[rows], self.lng[rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return rows[order], distances[order]
+
+    def _nearest_rows(self, lat: float, lng: float, k: int, min_wifi: Optional[float] = None,
+                      max_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # Search a growing radius: once it holds k places they are the k
+        # nearest, since everything outside is farther away.
+        limit = max_km if max_km is not None else math.pi * EARTH_RADIUS_KM
+        radius = min(limit, 2 * math.pi * EARTH_RADIUS_KM / (1 << self.zoom))
+        while True:
+            rows, distances = self._within_rows(lat, lng, radius, min_wifi)
+            if len(rows) >= k or radius >= limit:
+                return rows[:k], distances[:k]
+            radius = min(limit, radius * 4)
+
+    def _results(self, rows: np.ndarray, distances: np.ndarray) -> List[Dict]:
+        wifi = self.wifi[rows]
+        return [
+            {"id": place_id, "distanceKm": round(distance, 3), "wifiSpeed": None if math.isnan(speed) else speed}
+            for place_id, distance, speed in zip(self.ids[rows].tolist(), distances.tolist(), wifi.tolist())
+        ]
+
+    def nearest(self, lat: float, lng: float, k: int = 1, min_wifi: Optional[float] = None,
+                max_km: Optional[float] = None) -> List[Dict]:
+        """
+        The k places closest to a point, nearest first.
+
+        Args:
+            lat, lng: Query point.
+            k: Number of places to return.
+            min_wifi: Only places with a WiFi speed of at least this (Mbps).
+            max_km: Ignore places farther than this.
+        """
+        return self._results(*self._nearest_rows(lat, lng, k, min_wifi, max_km))
+
+    def within(self, lat: float, lng: float, radius_km: float, min_wifi: Optional[float] = None) -> List[Dict]:
+        """Places within radius_km of a point, nearest first."""
+        return self._results(*self._within_rows(lat, lng, radius_km, min_wifi))
+
+    def in_bbox(self, bbox: Tuple[float, float, float, float], min_wifi: Optional[float] = None) -> List[str]:
+        """IDs of places inside a (south, west, north, east) box."""
+        south, west, north, east = bbox
+        rows = self._filter_wifi(self._candidate_rows(bbox), min_wifi)
+        lat, lng = self.lat[rows], self.lng[rows]
+        in_lng = (lng >= west) & (lng <= east) if west <= east else (lng >= west) | (lng <= east)
+        return self.ids[rows[(lat >= south) & (lat <= north) & in_lng]].tolist()
+
+    def neighbor_lists(self, k: int = DEFAULT_NEIGHBORS, max_km: Optional[float] = None,
+                       min_wifi: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """Each place's k nearest other places, for precomputed "nearby" lists."""
+        neighbors = {}
+        for place_id, row in self._rows.items():
+            rows, distances = self._nearest_rows(self.lat[row], self.lng[row], k + 1, min_wifi, max_km)
+            others = rows != row
+            neighbors[place_id] = self._results(rows[others][:k], distances[others][:k])
+        return neighbors
+
+    def save(self, path: str = INDEX_FILE):
+        """Compact and atomically persist the index as .npz."""
+        self.compact()
+        directory = os.path.dirname(path) or "."
+        fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, zoom=np.array(self.zoom), ids=self.ids, lat=self.lat, lng=self.lng,
+                         wifi=self.wifi, cells=self.cells)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> "SpatialIndex":
+        with np.load(path) as data:
+            index = cls(int(data["zoom"]))
+            index.ids = data["ids"]
+            index.lat = data["lat"]
+            index.lng = data["lng"]
+            index.wifi = data["wifi"]
+            index.cells = data["cells"]
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index.indexed = len(index.ids)
+        index._rows = dict(zip(index.ids.tolist(), range(len(index.ids))))
+        return index
+
+def load_generated_places(path: str = GENERATED_PLACES_FILE) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(IDs, latitudes, longitudes, WiFi speeds) from transform_places.py output."""
+    with open(path, 'r', encoding='utf-8') as f:
+        places = [p for p in json.load(f) if p.get('coordinates')]
+    return (
+        np.array([p['id'] for p in places], dtype=str),
+        np.array([p['coordinates']['lat'] for p in places], dtype=np.float64),
+        np.array([p['coordinates']['lng'] for p in places], dtype=np.float64),
+        np.array([np.nan if p.get('wifiSpeed') is None else p['wifiSpeed'] for p in places], dtype=np.float32),
+    )
+
+def load_db_places(db_file: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """The same from coffee_shops, keyed like place_connectivity.load_places_db."""
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute(
+        """
+        SELECT COALESCE(google_places_id, CAST(id AS TEXT)), CAST(latitude AS REAL), CAST(longitude AS REAL),
+               CAST(wifi_speed AS REAL)
+        FROM coffee_shops WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        """
+    ).fetchall()
+    conn.close()
+    ids, lat, lng, wifi = zip(*rows) if rows else ((), (), (), ())
+    return (
+        np.array(ids, dtype=str),
+        np.array(lat, dtype=np.float64),
+        np.array(lng, dtype=np.float64),
+        np.array([np.nan if speed is None else speed for speed in wifi], dtype=np.float32),
+    )
+
+def update_index(index_file: str = INDEX_FILE, places_file: str = GENERATED_PLACES_FILE,
+                 db_file: Optional[str] = None, zoom: int = DEFAULT_GRID_ZOOM) -> SpatialIndex:
+    """Load the saved index (if any, and at the same zoom), sync it with the current places and save it."""
+    ids, lat, lng, wifi = load_db_places(db_file) if db_file else load_generated_places(places_file)
+    start = time.perf_counter()
+    index = SpatialIndex.load(index_file) if os.path.exists(index_file) else None
+    if index is not None and index.zoom == zoom:
+        upserted, removed = index.sync(ids, lat, lng, wifi)
+        logger.info(f"Updated {upserted} and removed {removed} of {len(index)} places in {index_file}")
+    else:
+        index = SpatialIndex.build(ids, lat, lng, wifi, zoom)
+        logger.info(f"Built index of {len(index)} places")
+    index.save(index_file)
+    logger.info(f"Saved {index_file} in {time.perf_counter() - start:.2f}s")
+    return index
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the place spatial index and run nearest/radius queries.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--places-file", default=GENERATED_PLACES_FILE, help="transform_places.py JSON output")
+    source.add_argument("--db", help="Read places from coffee_shops in this SQLite database instead")
+    parser.add_argument("--index", default=INDEX_FILE, help="Index file to update (built if missing)")
+    parser.add_argument("--zoom", type=int, default=DEFAULT_GRID_ZOOM, help="Grid cell zoom level")
+    parser.add_argument("--near", type=float, nargs=2, metavar=("LAT", "LNG"), help="Query point")
+    parser.add_argument("--k", type=int, default=DEFAULT_NEIGHBORS, help="Number of nearest places to return")
+    parser.add_argument("--radius-km", type=float, help="Return every place within this radius instead of the k nearest")
+    parser.add_argument("--min-wifi", type=float, help="Only places with at least this WiFi speed (Mbps)")
+    parser.add_argument("--neighbors-out", help=f"Write each place's k nearest places as JSON (e.g. {NEIGHBORS_FILE})")
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    index = update_index(args.index, args.places_file, args.db, args.zoom)
+
+    if args.neighbors_out:
+        start = time.perf_counter()
+        neighbors = index.neighbor_lists(args.k, args.radius_km, args.min_wifi)
+        with atomic_open(args.neighbors_out) as f:
+            json.dump(neighbors, f, ensure_ascii=False, indent=2, sort_keys=True)
+        logger.info(f"Wrote neighbour lists for {len(neighbors)} places to {args.neighbors_out} "
+                    f"in {time.perf_counter() - start:.1f}s")
+
+    if args.near:
+        lat, lng = args.near
+        start = time.perf_counter()
+        if args.radius_km is not None:
+            results = index.within(lat, lng, args.radius_km, args.min_wifi)
+        else:
+            results = index.nearest(lat, lng, args.k, args.min_wifi)
+        logger.info(f"Query took {(time.perf_counter() - start) * 1000:.2f}ms")
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+import argparse
+import calendar
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Constants
+OUTPUT_DIR = "database/synthetic"
+DEFAULT_SEED = 42
+DEFAULT_SHOPS = 50_000
+DEFAULT_HEATMAP_ROWS = 10_000_000
+DEFAULT_WIFI_TESTS = 2_000_000
+DEFAULT_CHECK_INS = 5_000_000
+# Rows generated and written per batch for the large tables.
+DEFAULT_CHUNK_ROWS = 1_000_000
+# Fixed end of the generated history, so a given seed always produces the same data.
+DEFAULT_END_DATE = "2025-01-01"
+DEFAULT_HISTORY_DAYS = 365
+FORMATS = ["csv", "parquet"]
+
+# Town centres (lat, lng) and their share of the shops. Shops are scattered
+# around each centre with a standard deviation of CITY_SPREAD_DEGREES.
+CITIES = [
+    ("Cape Town", -33.9249, 18.4241, 0.30),
+    ("Johannesburg", -26.2041, 28.0473, 0.25),
+    ("Durban", -29.8587, 31.0218, 0.12),
+    ("Pretoria", -25.7479, 28.2293, 0.12),
+    ("Stellenbosch", -33.9321, 18.8602, 0.06),
+    ("Somerset West", -34.0757, 18.8433, 0.05),
+    ("Port Elizabeth", -33.9608, 25.6022, 0.05),
+    ("Bloemfontein", -29.0852, 26.1596, 0.05),
+]
+CITY_SPREAD_DEGREES = 0.05
+
+NAME_PREFIXES = [
+    "Bean", "Brew", "Roast", "Grind", "Daily", "Urban", "Little", "Copper", "Velvet", "Harbour",
+    "Mountain", "Corner", "Pixel", "Byte", "Loop", "Origin", "Crema", "Ember", "Fynbos", "Baobab",
+]
+NAME_SUFFIXES = [
+    "Coffee", "Cafe", "Roasters", "Espresso Bar", "Coffee House", "Kitchen", "Lab", "Collective",
+    "Bakery", "Social",
+]
+STREETS = [
+    "Main Rd", "Church St", "Long St", "Bree St", "Victoria Rd", "Beach Rd", "Station Rd",
+    "Oak Ave", "Market St", "High St", "Dorp St", "Kloof St",
+]
+INTERNET_QUALITY = ["Poor", "Fair", "Good", "Very Good", "Excellent"]
+# Download speed (Mbps) thresholds for INTERNET_QUALITY.
+INTERNET_QUALITY_BINS = [10, 25, 50, 100]
+
+# Same ids and names as database/mock_metrics.csv.
+METRICS = ["speed", "vibe", "parking", "noise"]
+
+# Relative busyness by hour of day and day of week (Monday = 0), used to
+# place check-ins and WiFi tests in time and to shape heatmap values.
+HOURLY_WEIGHTS = np.array([
+    0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 1.0, 2.5, 4.0, 4.5, 4.0, 3.5,
+    4.0, 3.5, 3.0, 2.8, 2.5, 2.0, 1.5, 1.0, 0.7, 0.4, 0.2, 0.1,
+])
+DAILY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.05, 1.1, 1.3, 1.2])
+
+SHOPS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("name", pa.string()),
+    ("description", pa.string()),
+    ("address", pa.string()),
+    ("city", pa.string()),
+    ("country", pa.string()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("rating", pa.float64()),
+    ("google_places_id", pa.string()),
+    ("user_rating_count", pa.int64()),
+    ("wifi_speed", pa.int64()),
+    ("created_at", pa.int64()),
+    ("updated_at", pa.int64()),
+])
+PLACES_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("name", pa.string()),
+    ("address", pa.string()),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("phone", pa.string()),
+    ("average_spend_min", pa.float64()),
+    ("average_spend_max", pa.float64()),
+    ("internet_quality", pa.string()),
+    ("handicapped", pa.bool_()),
+    ("created_at", pa.timestamp("s")),
+])
+METRICS_SCHEMA = pa.schema([("id", pa.int64()), ("name", pa.string())])
+HEATMAP_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("place_id", pa.int64()),
+    ("metric_id", pa.int64()),
+    ("day_of_week", pa.int8()),
+    ("hour_of_day", pa.int8()),
+    ("value", pa.float64()),
+    ("created_at", pa.timestamp("s")),
+])
+WIFI_TESTS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("coffee_shop_id", pa.int64()),
+    ("speed", pa.int64()),
+    ("tested_at", pa.int64()),
+])
+CHECK_INS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("coffee_shop_id", pa.int64()),
+    ("checked_in_at", pa.int64()),
+])
+
+class TableWriter:
+    """
+    Streams record batches of one table to mock_<table>.csv (the layout
+    tools/load_init_db.py loads) and/or <table>.parquet, with a fixed schema.
+    """
+    def __init__(self, out_dir: str, table: str, schema: pa.Schema, formats: List[str]):
+        self.table = table
+        self.schema = schema
+        self.writers = []
+        self.paths = []
+        self.rows = 0
+        if "csv" in formats:
+            path = os.path.join(out_dir, f"mock_{table}.csv")
+            self.writers.append(pa_csv.CSVWriter(path, schema))
+            self.paths.append(path)
+        if "parquet" in formats:
+            path = os.path.join(out_dir, f"{table}.parquet")
+            self.writers.append(pq.ParquetWriter(path, schema, compression="zstd"))
+            self.paths.append(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns: Dict[str, object]):
+        batch = pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        for writer in self.writers:
+            if isinstance(writer, pq.ParquetWriter):
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+def pick(vocabulary: List[str], indices: np.ndarray) -> pa.Array:
+    """Vectorized lookup of strings by index."""
+    return pa.array(vocabulary).take(pa.array(indices))
+
+def join(*parts, separator: str = " ") -> pa.Array:
+    return pc.binary_join_element_wise(*parts, separator)
+
+def chunk_sizes(total: int, chunk_rows: int) -> Iterator[int]:
+    for start in range(0, total, chunk_rows):
+        yield min(chunk_rows, total - start)
+
+def sample_times(rng: np.random.Generator, size: int, end: int, days: int) -> np.ndarray:
+    """Epoch seconds over the last `days` days before `end`, following the busyness weights."""
+    midnights = end - np.arange(days, 0, -1, dtype=np.int64) * 86400
+    # 1970-01-01 was a Thursday (weekday 3).
+    day_weights = DAILY_WEIGHTS[(midnights // 86400 + 3) % 7]
+    midnight = midnights[rng.choice(days, size, p=day_weights / day_weights.sum())]
+    hour = rng.choice(24, size, p=HOURLY_WEIGHTS / HOURLY_WEIGHTS.sum())
+    return midnight + hour * 3600 + rng.integers(0, 3600, size)
+
+class Shops:
+    """The generated shops plus the per-shop traits the child tables are drawn from."""
+    def __init__(self, rng: np.random.Generator, count: int, end: int, days: int):
+        self.count = count
+        self.ids = np.arange(1, count + 1, dtype=np.int64)
+
+        weights = np.array([city[3] for city in CITIES])
+        self.city = rng.choice(len(CITIES), count, p=weights / weights.sum())
+        centres = np.array([(city[1], city[2]) for city in CITIES])
+        coords = centres[self.city] + rng.normal(0, CITY_SPREAD_DEGREES, (count, 2))
+        self.latitude = np.round(coords[:, 0], 6)
+        self.longitude = np.round(coords[:, 1], 6)
+
+        # Typical download speed per shop, and how busy it is (Zipf-like, so a
+        # few shops get most of the check-ins and tests, as in real data).
+        self.base_speed = np.clip(rng.lognormal(np.log(40), 0.7, count), 2, 1000)
+        popularity = 1.0 / rng.permutation(np.arange(1, count + 1)) ** 0.8
+        self.popularity = popularity / popularity.sum()
+        self.created_at = end - days * 86400 - rng.integers(0, 3 * 365 * 86400, count)
+        self.rating = np.round(np.clip(rng.normal(4.3, 0.35, count), 1, 5), 1)
+        self.user_rating_count = rng.zipf(1.6, count).clip(1, 20000)
+
+        self.names = join(
+            pick(NAME_PREFIXES, rng.integers(0, len(NAME_PREFIXES), count)),
+            pick(NAME_SUFFIXES, rng.integers(0, len(NAME_SUFFIXES), count)),
+        )
+        city_names = pick([city[0] for city in CITIES], self.city)
+        street = join(
+            pa.array(rng.integers(1, 300, count).astype(str)),
+            pick(STREETS, rng.integers(0, len(STREETS), count)),
+        )
+        self.cities = city_names
+        self.addresses = join(street, city_names, "South Africa", separator=", ")
+
+    def shop_columns(self, end: int) -> Dict[str, object]:
+        return {
+            "id": self.ids,
+            "name": self.names,
+            "description": join("Synthetic shop in", self.cities),
+            "address": self.addresses,
+            "city": self.cities,
+            "country": np.full(self.count, "South Africa"),
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "rating": self.rating,
+            "google_places_id": join("synthetic", pa.array(self.ids.astype(str)), separator="-"),
+            "user_rating_count": self.user_rating_count,
+            "wifi_speed": np.round(self.base_speed).astype(np.int64),
+            "created_at": self.created_at,
+            "updated_at": np.full(self.count, end, dtype=np.int64),
+        }
+
+    def place_columns(self, rng: np.random.Generator) -> Dict[str, object]:
+        spend_min = np.round(rng.uniform(20, 60, self.count), 2)
+        return {
+            "id": self.ids,
+            "name": self.names,
+            "address": self.addresses,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "phone": pa.array(np.char.add("+27 21 ", rng.integers(1000000, 9999999, self.count).astype(str))),
+            "average_spend_min": spend_min,
+            "average_spend_max": np.round(spend_min + rng.uniform(20, 120, self.count), 2),
+            "internet_quality": pick(INTERNET_QUALITY, np.digitize(self.base_speed, INTERNET_QUALITY_BINS)),
+            "handicapped": rng.random(self.count) < 0.6,
+            "created_at": pa.array(self.created_at, pa.int64()).cast(pa.timestamp("s")),
+        }
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw shop indices weighted by popularity."""
+        return rng.choice(self.count, size, p=self.popularity)
+
+def iter_heatmap(rng: np.random.Generator, shops: Shops, total: int, chunk_rows: int,
+                 end: int, days: int) -> Iterator[Dict[str, object]]:
+    """
+    Heatmap observations for random places and metrics, with day_of_week and
+    hour_of_day taken from the observation time. Each place/metric has a base
+    level; busy hours raise vibe and noise and lower speed and parking, plus
+    per-observation noise.
+    """
+    base = rng.uniform(30, 90, (shops.count, len(METRICS)))
+    base[:, 0] = np.clip(shops.base_speed, 0, 100)
+    # How each metric responds to busyness: speed/parking drop, vibe/noise rise.
+    response = np.array([-20.0, 25.0, -30.0, 35.0])
+    busyness = np.outer(DAILY_WEIGHTS, HOURLY_WEIGHTS)
+    busyness /= busyness.max()
+
+    next_id = 1
+    for size in chunk_sizes(total, chunk_rows):
+        place = rng.integers(0, shops.count, size)
+        metric = rng.integers(0, len(METRICS), size)
+        created_at = sample_times(rng, size, end, days)
+        day = (created_at // 86400 + 3) % 7
+        hour = (created_at // 3600) % 24
+        value = base[place, metric] + response[metric] * busyness[day, hour] + rng.normal(0, 8, size)
+        yield {
+            "id": np.arange(next_id, next_id + size, dtype=np.int64),
+            "place_id": shops.ids[place],
+            "metric_id": (metric + 1).astype(np.int64),
+            "day_of_week": day.astype(np.int8),
+            "hour_of_day": hour.astype(np.int8),
+            "value": np.round(np.clip(value, 0, 100), 1),
+            "created_at": pa.array(created_at, pa.int64()).cast(pa.timestamp("s")),
+        }
+        next_id += size
+
+def iter_wifi_tests(rng: np.random.Generator, shops: Shops, total: int, chunk_rows: int,
+                    end: int, days: int) -> Iterator[Dict[str, object]]:
+    """Speed tests scattered around each shop's typical speed, slower at busy hours."""
+    next_id = 1
+    for size in chunk_sizes(total, chunk_rows):
+        shop = shops.sample(rng, size)
+        tested_at = sample_times(rng, size, end, days)
+        hour = (tested_at // 3600) % 24
+        congestion = 1 - 0.3 * HOURLY_WEIGHTS[hour] / HOURLY_WEIGHTS.max()
+        speed = shops.base_speed[shop] * congestion * rng.lognormal(0, 0.35, size)
+        yield {
+            "id": np.arange(next_id, next_id + size, dtype=np.int64),
+            "coffee_shop_id": shops.ids[shop],
+            "speed": np.maximum(np.round(speed), 1).astype(np.int64),
+            "tested_at": tested_at,
+        }
+        next_id += size
+
+def iter_check_ins(rng: np.random.Generator, shops: Shops, total: int, chunk_rows: int,
+                   end: int, days: int) -> Iterator[Dict[str, object]]:
+    next_id = 1
+    for size in chunk_sizes(total, chunk_rows):
+        shop = shops.sample(rng, size)
+        yield {
+            "id": np.arange(next_id, next_id + size, dtype=np.int64),
+            "coffee_shop_id": shops.ids[shop],
+            "checked_in_at": sample_times(rng, size, end, days),
+        }
+        next_id += size
+
+def parse_date(value: str) -> int:
+    return calendar.timegm(time.strptime(value, "%Y-%m-%d"))
+
+def generate(out_dir: str = OUTPUT_DIR, shops: int = DEFAULT_SHOPS, heatmap_rows: int = DEFAULT_HEATMAP_ROWS,
+             wifi_tests: int = DEFAULT_WIFI_TESTS, check_ins: int = DEFAULT_CHECK_INS,
+             seed: int = DEFAULT_SEED, formats: Optional[List[str]] = None,
+             chunk_rows: int = DEFAULT_CHUNK_ROWS, end_date: str = DEFAULT_END_DATE,
+             days: int = DEFAULT_HISTORY_DAYS):
+    """
+    Generate a referentially consistent synthetic dataset.
+
+    coffee_shops and places share ids (shop N is place N), heatmap_data
+    references places and metrics, and wifi_tests/check_ins reference
+    coffee_shops. Every table draws from its own stream of one seed, so the
+    output is reproducible and changing one table's size leaves the others
+    as they were.
+    """
+    formats = formats or ["csv"]
+    os.makedirs(out_dir, exist_ok=True)
+    end = parse_date(end_date)
+    streams = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(5)]
+    start = time.perf_counter()
+
+    shop_set = Shops(streams[0], shops, end, days)
+    tables = [
+        ("coffee_shops", SHOPS_SCHEMA, [shop_set.shop_columns(end)]),
+        ("places", PLACES_SCHEMA, [shop_set.place_columns(streams[1])]),
+        ("metrics", METRICS_SCHEMA, [{"id": np.arange(1, len(METRICS) + 1), "name": METRICS}]),
+        ("heatmap_data", HEATMAP_SCHEMA, iter_heatmap(streams[2], shop_set, heatmap_rows, chunk_rows, end, days)),
+        ("wifi_tests", WIFI_TESTS_SCHEMA, iter_wifi_tests(streams[3], shop_set, wifi_tests, chunk_rows, end, days)),
+        ("check_ins", CHECK_INS_SCHEMA, iter_check_ins(streams[4], shop_set, check_ins, chunk_rows, end, days)),
+    ]
+    for table, schema, batches in tables:
+        with TableWriter(out_dir, table, schema, formats) as writer:
+            for columns in batches:
+                writer.write(columns)
+        print(f"Wrote {writer.rows} rows to {', '.join(writer.paths)}")
+
+    print(f"Generated synthetic data in {out_dir} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic load-testing data for the Brews & Bytes schema.")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR, help="Directory to write the tables to")
+    parser.add_argument("--shops", type=int, default=DEFAULT_SHOPS, help="Number of coffee shops (and places)")
+    parser.add_argument("--heatmap-rows", type=int, default=DEFAULT_HEATMAP_ROWS, help="Number of heatmap_data rows")
+    parser.add_argument("--wifi-tests", type=int, default=DEFAULT_WIFI_TESTS, help="Number of wifi_tests rows")
+    parser.add_argument("--check-ins", type=int, default=DEFAULT_CHECK_INS, help="Number of check_ins rows")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["csv"],
+                        help="Output formats (CSV is what tools/load_init_db.py loads)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows generated per batch")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="End of the generated history (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=DEFAULT_HISTORY_DAYS, help="Days of history to generate")
+    args = parser.parse_args()
+    generate(
+        args.out_dir,
+        args.shops,
+        args.heatmap_rows,
+        args.wifi_tests,
+        args.check_ins,
+        args.seed,
+        args.formats,
+        args.chunk_rows,
+        args.end_date,
+        args.days,
+    )
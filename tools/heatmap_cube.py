@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_DB_FILE = "website/database.sqlite"
+CUBE_FILE = "heatmap_cube.npz"
+JSON_DIR = "website/client/public/heatmaps"
+# Rows fetched from heatmap_data per round trip.
+FETCH_CHUNK_ROWS = 500_000
+# Fallback metric names (ids from database/mock_metrics.csv) when the
+# source has no metrics table.
+DEFAULT_METRICS = {1: "speed", 2: "vibe", 3: "parking", 4: "noise"}
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Hour labels as used by generateHeatmap in tools/place-card.js ('7am', '12pm', ...).
+HOUR_LABELS = [f"{(hour + 11) % 12 + 1}{'am' if hour < 12 else 'pm'}" for hour in range(24)]
+# Binary blobs store each cell's mean * 10 as a little-endian uint16; this marks "no data".
+BLOB_NO_DATA = 0xFFFF
+BLOB_SCALE = 10
+
+class HeatmapCube:
+    """
+    Dense (places, metrics, 7, 24) aggregate of heatmap_data observations.
+
+    Sums and counts are kept per cell, so new observations are folded in
+    without revisiting old rows, and means are derived on demand. The cube
+    remembers the highest heatmap_data id it has seen (the watermark) and
+    which places changed since they were last exported.
+    """
+    def __init__(self, metric_ids: Optional[List[int]] = None, metric_names: Optional[Dict[int, str]] = None):
+        self.metric_names = dict(metric_names or DEFAULT_METRICS)
+        self.metric_ids = np.array(sorted(metric_ids or self.metric_names), dtype=np.int64)
+        self.place_ids = np.zeros(0, dtype=np.int64)
+        # float32/int32 keep a national-scale cube (50k places x 4 metrics) around 270MB.
+        self.sums = np.zeros((0, len(self.metric_ids), 7, 24), dtype=np.float32)
+        self.counts = np.zeros((0, len(self.metric_ids), 7, 24), dtype=np.int32)
+        self.dirty = np.zeros(0, dtype=bool)
+        self.watermark = 0
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.sums.shape
+
+    def _ensure_places(self, place_ids: np.ndarray):
+        """Grow the cube to cover any place IDs it hasn't seen, keeping place_ids sorted."""
+        new_ids = np.setdiff1d(place_ids, self.place_ids)
+        if not len(new_ids):
+            return
+        merged = np.union1d(self.place_ids, new_ids)
+        positions = np.searchsorted(merged, self.place_ids)
+        cell_shape = self.sums.shape[1:]
+
+        sums = np.zeros((len(merged),) + cell_shape, dtype=self.sums.dtype)
+        counts = np.zeros((len(merged),) + cell_shape, dtype=self.counts.dtype)
+        dirty = np.zeros(len(merged), dtype=bool)
+        sums[positions] = self.sums
+        counts[positions] = self.counts
+        dirty[positions] = self.dirty
+        self.place_ids, self.sums, self.counts, self.dirty = merged, sums, counts, dirty
+
+    def add_observations(self, place_id: np.ndarray, metric_id: np.ndarray, day: np.ndarray,
+                         hour: np.ndarray, value: np.ndarray) -> int:
+        """
+        Fold a batch of observations into the cube.
+
+        Rows for metrics the cube doesn't track are ignored. Returns the number
+        of observations added.
+        """
+        metric_index = np.searchsorted(self.metric_ids, metric_id)
+        known = (metric_index < len(self.metric_ids)) & (
+            self.metric_ids[np.minimum(metric_index, len(self.metric_ids) - 1)] == metric_id
+        )
+        if not known.all():
+            place_id, day, hour, value = place_id[known], day[known], hour[known], value[known]
+            metric_index = metric_index[known]
+        if not len(place_id):
+            return 0
+
+        self._ensure_places(np.unique(place_id))
+        place_index = np.searchsorted(self.place_ids, place_id)
+        flat = ((place_index * len(self.metric_ids) + metric_index) * 7 + day.astype(np.int64)) * 24 + hour.astype(np.int64)
+        # Group the batch by cell and add each cell's total once: one
+        # vectorized pass, much faster than np.add.at for millions of rows,
+        # and only as large as the number of distinct cells touched.
+        cells, inverse = np.unique(flat, return_inverse=True)
+        self.sums.reshape(-1)[cells] += np.bincount(inverse, weights=value).astype(self.sums.dtype)
+        self.counts.reshape(-1)[cells] += np.bincount(inverse).astype(self.counts.dtype)
+        self.dirty[np.unique(place_index)] = True
+        return len(place_id)
+
+    def means(self, place_index=slice(None)) -> np.ndarray:
+        """Mean value per cell, NaN where there are no observations."""
+        counts = self.counts[place_index]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, self.sums[place_index] / counts, np.nan)
+
+    def place_slice(self, place_id: int) -> Optional[np.ndarray]:
+        """The (metrics, 7, 24) mean grid for one place, or None if it has no data."""
+        i = np.searchsorted(self.place_ids, place_id)
+        if i >= len(self.place_ids) or self.place_ids[i] != place_id:
+            return None
+        return self.means(i)
+
+    def place_json(self, place_index: int) -> Dict:
+        """
+        One place's grid in the shape place-card.js reads as place.heatmapData:
+        {metric: {day: {hour label: mean}}}, leaving out cells without data.
+        """
+        grid = np.round(self.means(place_index), 1).tolist()
+        has_data = (self.counts[place_index] > 0).tolist()
+        data = {}
+        for m, metric_id in enumerate(self.metric_ids):
+            by_day = {}
+            for d, day in enumerate(DAYS):
+                values, present = grid[m][d], has_data[m][d]
+                hours = {HOUR_LABELS[h]: values[h] for h in range(24) if present[h]}
+                if hours:
+                    by_day[day] = hours
+            data[self.metric_names.get(int(metric_id), str(metric_id))] = by_day
+        return data
+
+    def place_blob(self, place_index: int) -> bytes:
+        """One place's grid as metrics x 7 x 24 little-endian uint16 (mean * 10, 0xFFFF = no data)."""
+        grid = self.means(place_index)
+        scaled = np.where(np.isnan(grid), BLOB_NO_DATA, np.clip(np.round(grid * BLOB_SCALE), 0, BLOB_NO_DATA - 1))
+        return scaled.astype("<u2").tobytes()
+
+    def export(self, json_dir: Optional[str] = None, bin_dir: Optional[str] = None, only_dirty: bool = True) -> int:
+        """
+        Write <place_id>.json and/or <place_id>.bin per place and clear the
+        dirty flags. Returns the number of places exported.
+        """
+        indices = np.flatnonzero(self.dirty) if only_dirty else np.arange(len(self.place_ids))
+        for directory in (json_dir, bin_dir):
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        for i in indices:
+            place_id = int(self.place_ids[i])
+            if json_dir:
+                write_atomic(os.path.join(json_dir, f"{place_id}.json"),
+                             json.dumps(self.place_json(i), separators=(",", ":")).encode("utf-8"))
+            if bin_dir:
+                write_atomic(os.path.join(bin_dir, f"{place_id}.bin"), self.place_blob(i))
+        self.dirty[indices] = False
+        return len(indices)
+
+    def save(self, path: str = CUBE_FILE):
+        """Atomically persist the cube (including watermark and dirty flags) as .npz."""
+        directory = os.path.dirname(path) or "."
+        fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    place_ids=self.place_ids,
+                    metric_ids=self.metric_ids,
+                    metric_names=np.array([self.metric_names.get(int(m), str(m)) for m in self.metric_ids]),
+                    sums=self.sums,
+                    counts=self.counts,
+                    dirty=self.dirty,
+                    watermark=np.array(self.watermark),
+                )
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    @classmethod
+    def load(cls, path: str = CUBE_FILE) -> "HeatmapCube":
+        with np.load(path) as data:
+            metric_ids = [int(m) for m in data["metric_ids"]]
+            cube = cls(metric_ids, dict(zip(metric_ids, (str(n) for n in data["metric_names"]))))
+            cube.place_ids = data["place_ids"]
+            cube.sums = data["sums"]
+            cube.counts = data["counts"]
+            cube.dirty = data["dirty"]
+            cube.watermark = int(data["watermark"])
+        return cube
+
+def write_atomic(path: str, payload: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def read_metric_names(conn: sqlite3.Connection) -> Dict[int, str]:
+    try:
+        rows = conn.execute("SELECT id, name FROM metrics").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    return dict(rows) or dict(DEFAULT_METRICS)
+
+def iter_sqlite_rows(conn: sqlite3.Connection, after_id: int,
+                     chunk_rows: int = FETCH_CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """Yield heatmap_data rows with id > after_id as (n, 6) float arrays, in id order."""
+    cursor = conn.execute(
+        "SELECT id, place_id, metric_id, day_of_week, hour_of_day, value "
+        "FROM heatmap_data WHERE id > ? ORDER BY id",
+        (after_id,),
+    )
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield np.array(rows, dtype=np.float64)
+
+def iter_parquet_rows(path: str, after_id: int, chunk_rows: int = FETCH_CHUNK_ROWS) -> Iterator[np.ndarray]:
+    """Same as iter_sqlite_rows, for a heatmap_data Parquet file (e.g. from generate_synthetic_data.py)."""
+    import pyarrow.dataset as ds
+
+    columns = ["id", "place_id", "metric_id", "day_of_week", "hour_of_day", "value"]
+    dataset = ds.dataset(path, format="parquet")
+    for batch in dataset.to_batches(columns=columns, filter=ds.field("id") > after_id, batch_size=chunk_rows):
+        if batch.num_rows:
+            yield np.column_stack([batch.column(name).to_numpy() for name in columns]).astype(np.float64)
+
+def update_cube(cube: HeatmapCube, chunks: Iterator[np.ndarray]) -> int:
+    """Fold row chunks from iter_*_rows into the cube and advance its watermark."""
+    added = 0
+    for rows in chunks:
+        ids = rows[:, 0].astype(np.int64)
+        added += cube.add_observations(
+            rows[:, 1].astype(np.int64),
+            rows[:, 2].astype(np.int64),
+            rows[:, 3].astype(np.int64),
+            rows[:, 4].astype(np.int64),
+            rows[:, 5],
+        )
+        cube.watermark = max(cube.watermark, int(ids.max()))
+    return added
+
+def refresh_cube(db_file: str = DEFAULT_DB_FILE, cube_file: str = CUBE_FILE, parquet_file: Optional[str] = None,
+                 json_dir: Optional[str] = JSON_DIR, bin_dir: Optional[str] = None,
+                 rebuild: bool = False, export_all: bool = False):
+    """
+    Bring the cube up to date with heatmap_data and export the places that changed.
+
+    An existing cube file is loaded and only rows past its watermark are
+    read; with rebuild (or no cube file yet) the whole table is aggregated.
+    """
+    start = time.perf_counter()
+    conn = None
+    if parquet_file:
+        metric_names = dict(DEFAULT_METRICS)
+    else:
+        conn = sqlite3.connect(db_file)
+        metric_names = read_metric_names(conn)
+
+    if os.path.exists(cube_file) and not rebuild:
+        cube = HeatmapCube.load(cube_file)
+        print(f"Loaded cube {cube.shape} from {cube_file} (watermark {cube.watermark})")
+    else:
+        cube = HeatmapCube(metric_names=metric_names)
+
+    if parquet_file:
+        chunks = iter_parquet_rows(parquet_file, cube.watermark)
+    else:
+        chunks = iter_sqlite_rows(conn, cube.watermark)
+    added = update_cube(cube, chunks)
+    if conn is not None:
+        conn.close()
+    print(f"Added {added} observations; cube is now {cube.shape}")
+
+    exported = cube.export(json_dir, bin_dir, only_dirty=not export_all) if (json_dir or bin_dir) else 0
+    cube.save(cube_file)
+    print(f"Exported {exported} places, saved {cube_file} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the precomputed 7x24 heatmap cube and per-place exports.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="SQLite database containing heatmap_data")
+    parser.add_argument("--parquet", help="Read heatmap_data from this Parquet file instead of the database")
+    parser.add_argument("--cube-file", default=CUBE_FILE, help="Where the cube is persisted between runs")
+    parser.add_argument("--json-dir", default=JSON_DIR, help="Directory for per-place <id>.json grids")
+    parser.add_argument("--bin-dir", help="Directory for per-place <id>.bin uint16 grids")
+    parser.add_argument("--no-json", action="store_true", help="Don't write JSON grids")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the saved cube and aggregate every row")
+    parser.add_argument("--export-all", action="store_true", help="Export every place, not just the changed ones")
+    args = parser.parse_args()
+    refresh_cube(
+        args.db,
+        args.cube_file,
+        args.parquet,
+        None if args.no_json else args.json_dir,
+        args.bin_dir,
+        rebuild=args.rebuild,
+        export_all=args.export_all,
+    )
@@ -0,0 +1,512 @@
+import argparse
+import calendar
+import csv
+import json
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from transform_places import iter_places, load_change_set, mark_change_set_consumed
+
+# Constants
+# A separate database by default: the fixtures are mock data and must not land
+# in website/database.sqlite, which holds the real shops and users.
+DEFAULT_DB_FILE = "database/load_test.sqlite"
+CSV_DIR = "database"
+PLACES_DATA_FILE = "database/places_data.json"
+# Rows handed to executemany at a time; bounds memory on multi-million row files.
+DEFAULT_BATCH_SIZE = 50000
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# This script's name in the change file's pending change sets.
+CHANGE_CONSUMER = "load_init_db"
+
+# SQLite schema for every table the loader knows about. The application tables
+# match website/shared/schema.ts (timestamps as unix epoch seconds); the
+# heatmap tables are the SQLite form of database/brews_and_bytes_ddl.sql.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT NOT NULL UNIQUE,
+  password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  email TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  message TEXT NOT NULL,
+  created_at INTEGER DEFAULT (unixepoch())
+);
+CREATE TABLE IF NOT EXISTS signups (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  email TEXT NOT NULL,
+  city TEXT NOT NULL,
+  tribe TEXT,
+  created_at INTEGER DEFAULT (unixepoch())
+);
+CREATE TABLE IF NOT EXISTS subscribers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  email TEXT NOT NULL UNIQUE,
+  created_at INTEGER DEFAULT (unixepoch())
+);
+CREATE TABLE IF NOT EXISTS coffee_shops (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  description TEXT,
+  address TEXT NOT NULL,
+  city TEXT NOT NULL,
+  country TEXT NOT NULL,
+  postal_code TEXT,
+  latitude TEXT,
+  longitude TEXT,
+  website TEXT,
+  phone_number TEXT,
+  rating TEXT,
+  google_places_id TEXT,
+  price_level TEXT,
+  user_rating_count INTEGER,
+  business_status TEXT,
+  google_maps_uri TEXT,
+  opening_hours TEXT,
+  opens_at TEXT,
+  closes_at TEXT,
+  is_open_24_hours INTEGER DEFAULT 0,
+  wifi_speed INTEGER,
+  image_url TEXT,
+  thumbnail_url TEXT,
+  tribe TEXT,
+  vibe TEXT,
+  amenities TEXT,
+  created_at INTEGER DEFAULT (unixepoch()),
+  updated_at INTEGER DEFAULT (unixepoch())
+);
+CREATE TABLE IF NOT EXISTS wifi_tests (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  coffee_shop_id INTEGER NOT NULL REFERENCES coffee_shops(id),
+  speed INTEGER NOT NULL,
+  tested_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS check_ins (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  coffee_shop_id INTEGER NOT NULL REFERENCES coffee_shops(id),
+  checked_in_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS places (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  address TEXT,
+  latitude REAL,
+  longitude REAL,
+  phone TEXT,
+  average_spend_min REAL,
+  average_spend_max REAL,
+  internet_quality TEXT,
+  handicapped INTEGER DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS tribes (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE,
+  description TEXT
+);
+CREATE TABLE IF NOT EXISTS place_tribes (
+  place_id INTEGER NOT NULL REFERENCES places(id) ON DELETE CASCADE,
+  tribe_id INTEGER NOT NULL REFERENCES tribes(id) ON DELETE CASCADE,
+  PRIMARY KEY (place_id, tribe_id)
+);
+CREATE TABLE IF NOT EXISTS reviews (
+  id INTEGER PRIMARY KEY,
+  place_id INTEGER NOT NULL REFERENCES places(id) ON DELETE CASCADE,
+  user_name TEXT,
+  rating REAL CHECK (rating >= 0 AND rating <= 5),
+  comment TEXT,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS metrics (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS metric_details (
+  id INTEGER PRIMARY KEY,
+  place_id INTEGER NOT NULL REFERENCES places(id) ON DELETE CASCADE,
+  metric_id INTEGER NOT NULL REFERENCES metrics(id) ON DELETE CASCADE,
+  value REAL NOT NULL,
+  updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS heatmap_data (
+  id INTEGER PRIMARY KEY,
+  place_id INTEGER NOT NULL REFERENCES places(id) ON DELETE CASCADE,
+  metric_id INTEGER NOT NULL REFERENCES metrics(id) ON DELETE CASCADE,
+  day_of_week INTEGER NOT NULL CHECK (day_of_week BETWEEN 0 AND 6),
+  hour_of_day INTEGER NOT NULL CHECK (hour_of_day BETWEEN 0 AND 23),
+  value REAL NOT NULL,
+  created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Secondary (non-unique) indexes. They are dropped before a load and rebuilt
+# once afterwards, which is much cheaper than maintaining them row by row.
+INDEXES = {
+    "idx_coffee_shops_city": "coffee_shops(city)",
+    "idx_coffee_shops_google_places_id": "coffee_shops(google_places_id)",
+    "idx_coffee_shops_wifi_speed": "coffee_shops(wifi_speed)",
+    "idx_wifi_tests_coffee_shop": "wifi_tests(coffee_shop_id, tested_at)",
+    "idx_check_ins_coffee_shop": "check_ins(coffee_shop_id, checked_in_at)",
+    "idx_reviews_place": "reviews(place_id)",
+    "idx_metric_details_place_metric": "metric_details(place_id, metric_id)",
+    "idx_heatmap_place_metric": "heatmap_data(place_id, metric_id)",
+}
+
+# CSV-backed tables in load order (parents before children), with the natural
+# key used by --upsert, the columns stored as unix epoch seconds and the
+# boolean columns stored as 0/1.
+TABLES = {
+    "users": {"key": ["id"], "epoch": []},
+    "contacts": {"key": ["id"], "epoch": ["created_at"]},
+    "signups": {"key": ["id"], "epoch": ["created_at"]},
+    "subscribers": {"key": ["id"], "epoch": ["created_at"]},
+    "coffee_shops": {"key": ["id"], "epoch": ["created_at", "updated_at"]},
+    "wifi_tests": {"key": ["id"], "epoch": ["tested_at"]},
+    "check_ins": {"key": ["id"], "epoch": ["checked_in_at"]},
+    "places": {"key": ["id"], "epoch": [], "bool": ["handicapped"]},
+    "tribes": {"key": ["id"], "epoch": []},
+    "place_tribes": {"key": ["place_id", "tribe_id"], "epoch": []},
+    "reviews": {"key": ["id"], "epoch": []},
+    "metrics": {"key": ["id"], "epoch": []},
+    "metric_details": {"key": ["id"], "epoch": []},
+    "heatmap_data": {"key": ["id"], "epoch": []},
+}
+
+# Tuning applied for the duration of a load. The load is a single transaction,
+# so an interrupted run leaves the database as it was; synchronous=OFF only
+# risks the database on an OS crash mid-load, which a re-run recovers from.
+# journal_mode persists in the file, so the previous mode is put back after
+# the load (the website's better-sqlite3 scripts don't expect -wal/-shm files).
+BULK_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=OFF",
+]
+
+def to_epoch(value: str) -> Optional[int]:
+    """Convert a 'YYYY-MM-DD HH:MM:SS' (UTC) fixture timestamp to epoch seconds."""
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    return calendar.timegm(time.strptime(value, TIMESTAMP_FORMAT))
+
+def to_bool(value: str) -> Optional[int]:
+    """Fixture booleans are written as true/false."""
+    if value == "":
+        return None
+    return 1 if value.lower() in ("true", "t", "1") else 0
+
+def upsert_sql(table: str, columns: Sequence[str], key: Sequence[str], upsert: bool) -> str:
+    """Build the INSERT statement for a table, with an ON CONFLICT clause in upsert mode."""
+    placeholders = ", ".join("?" * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if not upsert:
+        return sql
+    updates = [f"{column} = excluded.{column}" for column in columns if column not in key]
+    if updates:
+        return f"{sql} ON CONFLICT({', '.join(key)}) DO UPDATE SET {', '.join(updates)}"
+    return f"{sql} ON CONFLICT({', '.join(key)}) DO NOTHING"
+
+def iter_chunks(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_csv_rows(path: str, columns: List[str], spec: Dict) -> Iterator[Tuple]:
+    """
+    Stream rows from a fixture CSV whose header has been read into columns.
+    Empty cells become NULL; epoch and boolean columns are converted, and
+    SQLite's column affinity takes care of numeric text.
+    """
+    converters: Dict[int, Callable] = {}
+    for i, column in enumerate(columns):
+        if column in spec["epoch"]:
+            converters[i] = to_epoch
+        elif column in spec.get("bool", []):
+            converters[i] = to_bool
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        if not converters:
+            for row in reader:
+                yield tuple([value or None for value in row])
+            return
+        for row in reader:
+            values = [value or None for value in row]
+            for i, convert in converters.items():
+                values[i] = convert(row[i])
+            yield tuple(values)
+
+def read_header(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f))
+
+def load_csv(conn: sqlite3.Connection, table: str, path: str, upsert: bool, batch_size: int) -> int:
+    """Load one fixture CSV into its table. Returns the number of rows written."""
+    spec = TABLES[table]
+    columns = read_header(path)
+    sql = upsert_sql(table, columns, spec["key"], upsert)
+    count = 0
+    for chunk in iter_chunks(iter_csv_rows(path, columns, spec), batch_size):
+        conn.executemany(sql, chunk)
+        count += len(chunk)
+    return count
+
+def format_enum(value: Optional[str]) -> Optional[str]:
+    """PRICE_LEVEL_MODERATE -> Moderate, OPERATIONAL -> Operational (as import-places.ts does)."""
+    if not value:
+        return None
+    return value.replace("_", " ").title().replace("Price Level ", "")
+
+def guess_city(address: str) -> str:
+    city = "Somerset West"
+    for name in ("Cape Town", "Stellenbosch", "Somerset West"):
+        if name in address:
+            city = name
+    return city
+
+def format_time(point: Optional[Dict]) -> Optional[str]:
+    if not point:
+        return None
+    return f"{point.get('hour', 0):02d}:{point.get('minute', 0):02d}"
+
+# coffee_shops columns written from a Google Places record, in row order.
+PLACE_COLUMNS = [
+    "name", "description", "address", "city", "country", "latitude", "longitude", "website",
+    "phone_number", "rating", "google_places_id", "opening_hours", "opens_at", "closes_at",
+    "tribe", "vibe", "amenities", "price_level", "user_rating_count", "business_status",
+    "google_maps_uri", "updated_at",
+]
+
+def place_to_row(place: Dict, now: int) -> Tuple:
+    """Map a Google Places record to coffee_shops columns, like website/server/import-places.ts."""
+    name = (place.get('displayName') or {}).get('text') or 'Unknown Coffee Shop'
+    address = place.get('formattedAddress') or ''
+    city = guess_city(address)
+    location = place.get('location') or {}
+    hours = place.get('regularOpeningHours')
+    periods = (hours or {}).get('periods') or []
+    first_period = periods[0] if periods else {}
+    rating = place.get('rating')
+    return (
+        name,
+        f"Experience {name} in {city}.",
+        address,
+        city,
+        "South Africa",
+        str(location['latitude']) if 'latitude' in location else None,
+        str(location['longitude']) if 'longitude' in location else None,
+        place.get('websiteUri'),
+        place.get('internationalPhoneNumber'),
+        str(rating) if rating is not None else None,
+        place['id'],
+        json.dumps(hours, ensure_ascii=False) if hours else None,
+        format_time(first_period.get('open')),
+        format_time(first_period.get('close')),
+        "Digital Nomad",
+        "Productive",
+        json.dumps({"wifi": True, "power": True, "parking": True}),
+        format_enum(place.get('priceLevel')),
+        place.get('userRatingCount'),
+        format_enum(place.get('businessStatus')),
+        place.get('googleMapsUri'),
+        now,
+    )
+
+def load_places(conn: sqlite3.Connection, path: str, upsert: bool, batch_size: int,
+                place_ids: Optional[Set[str]] = None) -> Tuple[int, int, int]:
+    """
+    Load a Google Places dump (JSON array or NDJSON) into coffee_shops.
+
+    Shops are matched on google_places_id, against rows already in the table
+    and rows inserted earlier in the same dump. In upsert mode a match is
+    updated in place (keeping its id and created_at); otherwise it is skipped,
+    so re-running the loader never duplicates a shop. With place_ids, only
+    those places are loaded.
+
+    Returns:
+        Tuple[int, int, int]: Counts of (inserted, updated, skipped) shops.
+    """
+    existing: Dict[str, int] = dict(conn.execute(
+        "SELECT google_places_id, id FROM coffee_shops WHERE google_places_id IS NOT NULL"
+    ))
+
+    now = int(time.time())
+    insert_sql = (
+        f"INSERT INTO coffee_shops ({', '.join(PLACE_COLUMNS)}, created_at) "
+        f"VALUES ({', '.join('?' * len(PLACE_COLUMNS))}, ?)"
+    )
+    update_sql = (
+        f"UPDATE coffee_shops SET {', '.join(f'{column} = ?' for column in PLACE_COLUMNS)} WHERE id = ?"
+    )
+    inserted = updated = skipped = 0
+    for chunk in iter_chunks(iter_places(path), batch_size):
+        # Keyed by place id so a place repeated within the chunk is written once (last wins).
+        inserts: Dict[str, Tuple] = {}
+        updates: Dict[int, Tuple] = {}
+        for place in chunk:
+            if place_ids is not None and place['id'] not in place_ids:
+                continue
+            shop_id = existing.get(place['id'])
+            if (shop_id is not None or place['id'] in inserts) and not upsert:
+                skipped += 1
+                continue
+            row = place_to_row(place, now)
+            if shop_id is None:
+                inserts[place['id']] = row + (now,)
+            else:
+                updates[shop_id] = row + (shop_id,)
+        last_id = conn.execute("SELECT coalesce(max(id), 0) FROM coffee_shops").fetchone()[0]
+        conn.executemany(insert_sql, inserts.values())
+        conn.executemany(update_sql, updates.values())
+        # Register the new rows so later chunks match them too.
+        existing.update(conn.execute(
+            "SELECT google_places_id, id FROM coffee_shops WHERE id > ?", (last_id,)
+        ))
+        inserted += len(inserts)
+        updated += len(updates)
+    return inserted, updated, skipped
+
+def delete_places(conn: sqlite3.Connection, place_ids: Iterable[str]) -> int:
+    """Delete the shops with these google_places_ids, with their wifi tests and check-ins."""
+    conn.execute("CREATE TEMP TABLE removed_shops (id INTEGER PRIMARY KEY)")
+    try:
+        place_ids = set(place_ids)
+        conn.executemany("INSERT INTO removed_shops VALUES (?)", (
+            (shop_id,) for place_id, shop_id in conn.execute(
+                "SELECT google_places_id, id FROM coffee_shops WHERE google_places_id IS NOT NULL"
+            ) if place_id in place_ids
+        ))
+        for table in ("wifi_tests", "check_ins"):
+            conn.execute(f"DELETE FROM {table} WHERE coffee_shop_id IN (SELECT id FROM removed_shops)")
+        return conn.execute("DELETE FROM coffee_shops WHERE id IN (SELECT id FROM removed_shops)").rowcount
+    finally:
+        conn.execute("DROP TABLE removed_shops")
+
+def drop_indexes(conn: sqlite3.Connection):
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+def create_indexes(conn: sqlite3.Connection):
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+def load_init_db(db_file: str = DEFAULT_DB_FILE, csv_dir: Optional[str] = CSV_DIR,
+                 places_file: Optional[str] = PLACES_DATA_FILE, upsert: bool = False,
+                 reset: bool = False, tables: Optional[List[str]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE, changes_file: Optional[str] = None):
+    """
+    Bulk load the mock_<table>.csv fixtures in csv_dir and a places dump into SQLite.
+
+    Everything is written in one transaction with secondary indexes dropped
+    and rebuilt at the end. By default rows are plain INSERTs (fastest, fails
+    on duplicate ids); upsert updates existing rows by their natural key
+    instead, so the loader can be re-run over a populated database.
+
+    With changes_file, only the place changes from google_places_api.py not yet
+    applied here are loaded: added and changed places are upserted, removed
+    ones deleted, and the CSV fixtures are skipped.
+    """
+    changes = load_change_set(changes_file, CHANGE_CONSUMER) if changes_file else None
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+    conn.executescript(SCHEMA)
+
+    selected = [table for table in TABLES if tables is None or table in tables]
+    csv_files = {}
+    if csv_dir and changes is None:
+        for table in selected:
+            path = os.path.join(csv_dir, f"mock_{table}.csv")
+            if os.path.exists(path):
+                csv_files[table] = path
+
+    start = time.perf_counter()
+    total = 0
+    changes_applied = False
+    conn.execute("BEGIN")
+    try:
+        if changes is None:
+            drop_indexes(conn)
+        if reset:
+            for table in reversed(list(csv_files)):
+                conn.execute(f"DELETE FROM {table}")
+        for table, path in csv_files.items():
+            count = load_csv(conn, table, path, upsert, batch_size)
+            total += count
+            print(f"Loaded {count} rows into {table} from {path}")
+        if places_file and (tables is None or "coffee_shops" in tables):
+            if changes is not None:
+                removed = delete_places(conn, changes['removed'])
+                total += removed
+                print(f"Deleted {removed} removed places from coffee_shops")
+            if os.path.exists(places_file):
+                place_ids = None if changes is None else set(changes['added']) | set(changes['changed'])
+                inserted, updated, skipped = load_places(
+                    conn, places_file, upsert or changes is not None, batch_size, place_ids
+                )
+                total += inserted + updated
+                changes_applied = changes is not None
+                print(f"Loaded {places_file} into coffee_shops: {inserted} inserted, "
+                      f"{updated} updated, {skipped} skipped")
+            else:
+                print(f"{places_file} not found, skipping place import.")
+        create_indexes(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Checkpoints the WAL back into the database and removes the sidecar files.
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    if changes_applied:
+        mark_change_set_consumed(changes_file, CHANGE_CONSUMER, changes)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {total} rows to {db_file} in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load the CSV fixtures and Google Places data into SQLite.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="SQLite database file to load into")
+    parser.add_argument("--csv-dir", default=CSV_DIR, help="Directory containing mock_<table>.csv files")
+    parser.add_argument("--places-file", default=PLACES_DATA_FILE,
+                        help="Google Places dump to import into coffee_shops (JSON array or NDJSON)")
+    parser.add_argument("--no-places", action="store_true", help="Skip the Google Places import")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), help="Only load these tables")
+    parser.add_argument("--upsert", action="store_true",
+                        help="Update existing rows by natural key (id, or google_places_id for places) instead of failing")
+    parser.add_argument("--reset", action="store_true", help="Delete existing rows from the loaded tables first")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per executemany batch")
+    parser.add_argument("--changes",
+                        help="Change file from google_places_api.py; only apply the place changes not loaded yet")
+    args = parser.parse_args()
+    load_init_db(
+        args.db,
+        args.csv_dir,
+        None if args.no_places else args.places_file,
+        upsert=args.upsert,
+        reset=args.reset,
+        tables=args.tables,
+        batch_size=args.batch_size,
+        changes_file=args.changes,
+    )
@@ -1,13 +1,30 @@
+import argparse
+import hashlib
 import json
 import random
 import re
 import os
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 # Constants
 PLACES_DATA_FILE = "places_data.json"
 OUTPUT_FILE = "website/client/src/lib/generated_places.json"
 IMAGES_BASE_URL = "/places_images"
+IMAGES_DIR = "website/client/public/places_images"
+# This script's name in the change file's pending change sets.
+CHANGE_CONSUMER = "transform_places"
+# Responsive variants written by src/compress.py --variants
+VARIANTS_BASE_URL = "/places_images_variants"
+VARIANTS_DIR = "website/client/public/places_images_variants"
+FALLBACK_IMAGE_URL = "https://picsum.photos/500/300?random=1"
+# Place cards are rendered at about this width (CSS pixels x2 for retina).
+CARD_IMAGE_WIDTH = 640
+# Preferred image formats, best first.
+IMAGE_FORMAT_PREFERENCE = ["webp", "jpg", "jpeg", "png"]
+# Places transformed and written per batch in --stream mode.
+DEFAULT_BATCH_SIZE = 5000
+# Bytes read at a time when incrementally parsing a JSON array.
+READ_CHUNK_SIZE = 1024 * 1024
 
 # Mock Data for random generation
 VIBES = [
@@ -35,8 +52,400 @@ def sanitize_filename(name: str) -> str:
     """Sanitize a string to match the directory naming convention."""
     return re.sub(r'[<>:"/\\|?*]', '', name).strip()
 
-def transform_places():
-    """Reads Google Places data and transforms it to the CoffeeShop model."""
+_PHOTO_FILE = re.compile(r'^photo_(\d+)\.(\w+)$')
+_VARIANT_FILE = re.compile(r'^photo_(\d+)-(\d+)\.(\w+)$')
+
+class ImageIndex:
+    """
+    Index of the place images that actually exist on disk, built with one
+    scandir pass over the images (and variants) tree instead of a stat per
+    place, and optionally persisted to JSON so repeated builds skip the scan.
+    
+    For each place directory it records the original photos
+    ({photo number: [extensions]}) and the responsive variants
+    ({photo number: {extension: [widths]}}), along with the directory's
+    mtime so a persisted index only rescans directories that changed.
+    """
+    def __init__(self, photos: Dict[str, Dict], variants: Dict[str, Dict],
+                 mtimes: Optional[Dict[str, Dict[str, int]]] = None):
+        self.photos = photos
+        self.variants = variants
+        self.mtimes = mtimes or {"photos": {}, "variants": {}}
+
+    @staticmethod
+    def _scan_dir(path: str, pattern: re.Pattern) -> Dict:
+        entries = {}
+        with os.scandir(path) as files:
+            for file in files:
+                match = pattern.match(file.name)
+                if not match:
+                    continue
+                number = match.group(1)
+                if pattern is _VARIANT_FILE:
+                    width, ext = int(match.group(2)), match.group(3).lower()
+                    entries.setdefault(number, {}).setdefault(ext, []).append(width)
+                else:
+                    entries.setdefault(number, []).append(match.group(2).lower())
+        return entries
+
+    @classmethod
+    def _scan(cls, root: str, pattern: re.Pattern, previous: Optional[Dict[str, Dict]] = None,
+              previous_mtimes: Optional[Dict[str, int]] = None) -> Tuple[Dict[str, Dict], Dict[str, int], int]:
+        """
+        Index the place directories under root. Directories whose mtime
+        matches previous_mtimes reuse their previous entries; the rest are
+        listed. Adding, removing or replacing a file (including an atomic
+        rename over it) updates its directory's mtime.
+        Returns (index, mtimes, directories listed).
+        """
+        previous = previous or {}
+        previous_mtimes = previous_mtimes or {}
+        index, mtimes = {}, {}
+        listed = 0
+        if not os.path.isdir(root):
+            return index, mtimes, listed
+        with os.scandir(root) as place_dirs:
+            for place_dir in place_dirs:
+                if not place_dir.is_dir():
+                    continue
+                mtime = place_dir.stat().st_mtime_ns
+                mtimes[place_dir.name] = mtime
+                if previous_mtimes.get(place_dir.name) == mtime:
+                    entries = previous.get(place_dir.name)
+                else:
+                    entries = cls._scan_dir(place_dir.path, pattern)
+                    listed += 1
+                if entries:
+                    index[place_dir.name] = entries
+        return index, mtimes, listed
+
+    @classmethod
+    def scan(cls, images_dir: str = IMAGES_DIR, variants_dir: str = VARIANTS_DIR,
+             previous: Optional["ImageIndex"] = None) -> "ImageIndex":
+        """Scan the image trees, reusing previous's entries for directories that haven't changed."""
+        previous = previous or cls({}, {})
+        photos, photo_mtimes, listed_photos = cls._scan(images_dir, _PHOTO_FILE, previous.photos,
+                                                        previous.mtimes.get("photos"))
+        variants, variant_mtimes, listed_variants = cls._scan(variants_dir, _VARIANT_FILE, previous.variants,
+                                                              previous.mtimes.get("variants"))
+        print(f"Image index: listed {listed_photos} photo and {listed_variants} variant directories.")
+        return cls(photos, variants, {"photos": photo_mtimes, "variants": variant_mtimes})
+
+    @classmethod
+    def load_or_scan(cls, index_file: Optional[str] = None, rescan: bool = False) -> "ImageIndex":
+        """
+        Load a persisted index and refresh the directories that changed since
+        it was saved, or scan the whole image tree (with rescan or no
+        index_file). The result is saved back if index_file is set.
+        """
+        previous = None
+        if index_file and not rescan and os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Indexes saved without mtimes are rescanned in full.
+            previous = cls(data["photos"], data["variants"], data.get("mtimes"))
+            # Without the image tree here (e.g. a build box) there is nothing
+            # to check against, so the saved index is used as is.
+            if not os.path.isdir(IMAGES_DIR):
+                return previous
+        index = cls.scan(previous=previous)
+        if index_file:
+            with open(index_file, 'w', encoding='utf-8') as f:
+                json.dump({"photos": index.photos, "variants": index.variants, "mtimes": index.mtimes},
+                          f, ensure_ascii=False)
+        return index
+
+    def best_image_url(self, place_dir: str, target_width: int = CARD_IMAGE_WIDTH) -> str:
+        """
+        Pick the best existing image for a place: the lowest-numbered photo,
+        as the smallest variant at least target_width wide (or the largest
+        one) in the preferred format, else the original file, else the
+        fallback image.
+        """
+        variants = self.variants.get(place_dir, {})
+        for number in sorted(variants, key=int):
+            for ext in IMAGE_FORMAT_PREFERENCE:
+                widths = sorted(variants[number].get(ext, []))
+                if widths:
+                    width = next((w for w in widths if w >= target_width), widths[-1])
+                    return f"{VARIANTS_BASE_URL}/{place_dir}/photo_{number}-{width}.{ext}"
+        
+        photos = self.photos.get(place_dir, {})
+        for number in sorted(photos, key=int):
+            for ext in IMAGE_FORMAT_PREFERENCE:
+                if ext in photos[number]:
+                    return f"{IMAGES_BASE_URL}/{place_dir}/photo_{number}.{ext}"
+        
+        return FALLBACK_IMAGE_URL
+
+def place_rng(place_id: str) -> random.Random:
+    """
+    Random generator seeded from the place ID, so the synthesized attributes
+    of a place are the same on every run and unchanged places produce
+    byte-identical output.
+    """
+    seed = int.from_bytes(hashlib.sha256(place_id.encode('utf-8')).digest()[:8], 'big')
+    return random.Random(seed)
+
+def load_connectivity(path: str) -> Dict[str, Dict]:
+    """Per-place Ookla baselines written by src/place_connectivity.py, keyed by place ID."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def prior_wifi_speed(place_id: str, connectivity: Optional[Dict[str, Dict]]) -> Optional[int]:
+    """The place's measured Ookla download baseline in Mbps, if there is one."""
+    baseline = (connectivity or {}).get(place_id)
+    if not baseline:
+        return None
+    return max(1, round(baseline['downloadMbps']))
+
+def place_image_url(place: Dict, image_index: Optional[ImageIndex] = None) -> str:
+    """
+    Images live in website/client/public/places_images/<Place Name>/, so the
+    URL is relative to public, e.g. /places_images/Place Name/photo_1.jpg.
+    With an index of what is on disk we pick the best existing file;
+    without one we assume the downloaded photo_1.jpg is there.
+    """
+    sanitized_name = sanitize_filename(place.get('displayName', {}).get('text', 'Unknown'))
+    if image_index is not None:
+        return image_index.best_image_url(sanitized_name)
+    return f"{IMAGES_BASE_URL}/{sanitized_name}/photo_1.jpg"
+
+def transform_place(place: Dict, image_index: Optional[ImageIndex] = None,
+                    connectivity: Optional[Dict[str, Dict]] = None) -> Dict:
+    """Transform a single Google Places record into a CoffeeShop object."""
+    place_name = place.get('displayName', {}).get('text', 'Unknown')
+    image_url = place_image_url(place, image_index)
+    
+    # Generate mock attributes, deterministically per place
+    rng = place_rng(place['id'])
+    wifi_speed = rng.randint(15, 150)
+    # Prefer the area's measured Ookla baseline. The random draw above still
+    # happens so the attributes drawn after it don't change.
+    prior = prior_wifi_speed(place['id'], connectivity)
+    if prior is not None:
+        wifi_speed = prior
+    num_vibes = rng.randint(1, 3)
+    place_vibes = rng.sample(VIBES, num_vibes)
+    
+    num_popular = rng.randint(1, 2)
+    place_popular = rng.sample(POPULAR_WITH, num_popular)
+    
+    description = rng.choice(DESCRIPTIONS)
+    if place.get('rating'):
+        description += f" Rated {place.get('rating')} stars by locals."
+
+    # Construct the CoffeeShop object
+    coffee_shop = {
+        "id": place['id'],
+        "name": place_name,
+        "description": description,
+        "imageUrl": image_url,
+        "wifiSpeed": wifi_speed,
+        "vibes": place_vibes,
+        "popularWith": place_popular,
+        "address": place.get('formattedAddress'),
+        "city": "Somerset West", # Hardcoded for this batch as known context
+        "country": "South Africa",
+        "updated": "Today",
+        "coordinates": {
+            "lat": place['location']['latitude'],
+            "lng": place['location']['longitude']
+        }
+    }
+    
+    return coffee_shop
+
+# Whitespace and the comma separating array elements.
+_SEPARATOR = re.compile(r'[\s,]*')
+
+def iter_json_array(path: str) -> Iterator[Dict]:
+    """
+    Yield the elements of a top-level JSON array one at a time, reading the
+    file in chunks so only the current element is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(READ_CHUNK_SIZE).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if buffer.startswith(']', pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element continues past the buffer: drop what has been
+                # consumed and read more.
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+def iter_places(path: str) -> Iterator[Dict]:
+    """Stream places from an NDJSON (.ndjson/.jsonl) file or a JSON array file."""
+    if path.endswith(('.ndjson', '.jsonl')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from iter_json_array(path)
+
+def iter_batches(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class JsonArrayWriter:
+    """Writes a JSON array incrementally, formatted like json.dump(..., indent=2)."""
+    def __init__(self, path: str):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.f.write("[")
+        self.count = 0
+
+    def write_batch(self, records: List[Dict]):
+        for record in records:
+            item = json.dumps(record, indent=2, ensure_ascii=False)
+            self.f.write(",\n" if self.count else "\n")
+            self.f.write("\n".join("  " + line for line in item.splitlines()))
+            self.count += 1
+
+    def close(self):
+        self.f.write("\n]" if self.count else "]")
+        self.f.close()
+
+class NdjsonWriter:
+    def __init__(self, path: str):
+        self.f = open(path, 'w', encoding='utf-8')
+
+    def write_batch(self, records: List[Dict]):
+        self.f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    def close(self):
+        self.f.close()
+
+class ParquetWriter:
+    """Writes each batch as a Parquet row group through pyarrow."""
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("name", pa.string()),
+            ("description", pa.string()),
+            ("imageUrl", pa.string()),
+            ("wifiSpeed", pa.int32()),
+            ("vibes", pa.list_(pa.string())),
+            ("popularWith", pa.list_(pa.string())),
+            ("address", pa.string()),
+            ("city", pa.string()),
+            ("country", pa.string()),
+            ("updated", pa.string()),
+            ("coordinates", pa.struct([("lat", pa.float64()), ("lng", pa.float64())])),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_batch(self, records: List[Dict]):
+        self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def build_image_index(index_file: Optional[str] = None, rescan: bool = False) -> Optional[ImageIndex]:
+    """Index the image tree, or return None (assume photo_1.jpg) if it isn't present here."""
+    if not os.path.isdir(IMAGES_DIR) and not (index_file and os.path.exists(index_file)):
+        print(f"{IMAGES_DIR} not found, assuming photo_1.jpg exists for every place.")
+        return None
+    return ImageIndex.load_or_scan(index_file, rescan)
+
+def transform_places_streaming(input_file: str = PLACES_DATA_FILE, batch_size: int = DEFAULT_BATCH_SIZE,
+                               ndjson_output: Optional[str] = None, parquet_output: Optional[str] = None,
+                               image_index: Optional[ImageIndex] = None,
+                               connectivity: Optional[Dict[str, Dict]] = None):
+    """
+    Streaming variant of transform_places for large place dumps.
+    
+    Places are read incrementally (NDJSON or JSON array), transformed in
+    batches of batch_size, and each batch is appended to OUTPUT_FILE and to
+    the optional NDJSON and Parquet outputs, so memory stays flat no matter
+    how many places there are.
+    """
+    if not os.path.exists(input_file):
+        print(f"Error: {input_file} not found.")
+        return
+    
+    writers = [JsonArrayWriter(OUTPUT_FILE)]
+    if ndjson_output:
+        writers.append(NdjsonWriter(ndjson_output))
+    if parquet_output:
+        writers.append(ParquetWriter(parquet_output))
+    
+    total = 0
+    try:
+        for batch in iter_batches(iter_places(input_file), batch_size):
+            records = [transform_place(place, image_index, connectivity) for place in batch]
+            for writer in writers:
+                writer.write_batch(records)
+            total += len(records)
+    finally:
+        for writer in writers:
+            writer.close()
+    
+    outputs = [OUTPUT_FILE] + [path for path in (ndjson_output, parquet_output) if path]
+    print(f"Successfully transformed {total} places to {', '.join(outputs)}")
+
+# Shape of the change file written by src/place_delta.py: a pending change set
+# per consumer, accumulated across harvests until that consumer clears it.
+EMPTY_CHANGE_SET = {"added": [], "removed": [], "changed": {}, "newPhotos": {}, "photoFiles": []}
+
+def load_change_set(changes_file: str, consumer: str) -> Dict:
+    """Load the changes consumer hasn't applied yet from a change file written by google_places_api.py."""
+    with open(changes_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if "pending" not in data:
+        # A bare change set from an older harvester.
+        return data
+    return data["pending"].get(consumer) or EMPTY_CHANGE_SET
+
+def mark_change_set_consumed(changes_file: str, consumer: str, changes: Dict):
+    """
+    Clear consumer's pending changes once they are applied, unless a harvest
+    has added more since they were loaded.
+    """
+    with open(changes_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    pending = data.get("pending", {}).get(consumer)
+    if not pending or pending.get("sequence") != changes.get("sequence"):
+        return
+    data["pending"][consumer] = None
+    tmp_file = f"{changes_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, changes_file)
+
+def transform_places(changes_file: Optional[str] = None, image_index: Optional[ImageIndex] = None,
+                     connectivity: Optional[Dict[str, Dict]] = None):
+    """
+    Reads Google Places data and transforms it to the CoffeeShop model.
+    
+    With a change set, only added/changed places are transformed; every other
+    place keeps its previously generated entry and removed places are dropped.
+    """
     
     if not os.path.exists(PLACES_DATA_FILE):
         print(f"Error: {PLACES_DATA_FILE} not found.")
@@ -45,63 +454,70 @@ def transform_places():
     with open(PLACES_DATA_FILE, 'r', encoding='utf-8') as f:
         google_places = json.load(f)
     
+    changes = load_change_set(changes_file, CHANGE_CONSUMER) if changes_file else None
+    full_run = changes is None or not os.path.exists(OUTPUT_FILE)
+    if changes is not None and full_run:
+        print(f"{OUTPUT_FILE} not found, transforming all places.")
+    previous_output = {}
+    dirty_ids = set()
+    if not full_run:
+        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
+            previous_output = {shop['id']: shop for shop in json.load(f)}
+        dirty_ids = set(changes['added']) | set(changes['changed'])
+        # A refreshed Ookla baseline changes wifiSpeed without the place changing.
+        dirty_ids |= {
+            place_id for place_id, shop in previous_output.items()
+            if prior_wifi_speed(place_id, connectivity) not in (None, shop.get('wifiSpeed'))
+        }
+        removed_ids = set(changes['removed'])
+        google_places = [p for p in google_places if p['id'] not in removed_ids]
+        # Likewise new or recompressed images change imageUrl.
+        if image_index is not None:
+            dirty_ids |= {
+                place['id'] for place in google_places
+                if place['id'] in previous_output
+                and place_image_url(place, image_index) != previous_output[place['id']].get('imageUrl')
+            }
+    
     transformed_places = []
     
     for place in google_places:
-        place_name = place.get('displayName', {}).get('text', 'Unknown')
-        sanitized_name = sanitize_filename(place_name)
-        
-        # Check if we have photos locally
-        # We assume if the folder exists and has files, we take the first one
-        image_url = "https://picsum.photos/500/300?random=1" # Fallback
-        
-        # In the previous step, we moved images to website/client/public/places_images
-        # The path should be relative to public, e.g., /places_images/Place Name/photo_1.jpg
-        # We need to check if the directory exists in the source location or assume it moved.
-        # Since we moved it, let's assume the structure is correct.
-        
-        # Note: In a real script we might want to verify file existence, but for now we construct the path.
-        # We downloaded as photo_1.jpg
-        image_url = f"{IMAGES_BASE_URL}/{sanitized_name}/photo_1.jpg"
-        
-        # Generate random attributes
-        wifi_speed = random.randint(15, 150)
-        num_vibes = random.randint(1, 3)
-        place_vibes = random.sample(VIBES, num_vibes)
-        
-        num_popular = random.randint(1, 2)
-        place_popular = random.sample(POPULAR_WITH, num_popular)
-        
-        description = random.choice(DESCRIPTIONS)
-        if place.get('rating'):
-            description += f" Rated {place.get('rating')} stars by locals."
-
-        # Construct the CoffeeShop object
-        coffee_shop = {
-            "id": place['id'],
-            "name": place_name,
-            "description": description,
-            "imageUrl": image_url,
-            "wifiSpeed": wifi_speed,
-            "vibes": place_vibes,
-            "popularWith": place_popular,
-            "address": place.get('formattedAddress'),
-            "city": "Somerset West", # Hardcoded for this batch as known context
-            "country": "South Africa",
-            "updated": "Today",
-            "coordinates": {
-                "lat": place['location']['latitude'],
-                "lng": place['location']['longitude']
-            }
-        }
+        if not full_run and place['id'] not in dirty_ids and place['id'] in previous_output:
+            transformed_places.append(previous_output[place['id']])
+            continue
         
-        transformed_places.append(coffee_shop)
+        transformed_places.append(transform_place(place, image_index, connectivity))
         
     # Save to file
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         json.dump(transformed_places, f, indent=2, ensure_ascii=False)
         
+    if changes is not None:
+        # A full run has applied these changes too.
+        mark_change_set_consumed(changes_file, CHANGE_CONSUMER, changes)
+    if not full_run:
+        print(f"Re-transformed {len(dirty_ids)} changed places")
     print(f"Successfully transformed {len(transformed_places)} places to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    transform_places()
+    parser = argparse.ArgumentParser(description="Transform Google Places data into the CoffeeShop model.")
+    parser.add_argument("--changes", help="Change set from google_places_api.py; only re-transform what changed")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream places in batches with flat memory use (for large dumps)")
+    parser.add_argument("--input", default=PLACES_DATA_FILE,
+                        help="Places file for --stream: a JSON array or NDJSON (.ndjson/.jsonl)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Places per batch in --stream mode")
+    parser.add_argument("--ndjson-out", help="Also write the places as NDJSON (--stream mode)")
+    parser.add_argument("--parquet-out", help="Also write the places as Parquet (--stream mode)")
+    parser.add_argument("--image-index", help="Persist the image index to this JSON file; later runs only rescan directories that changed")
+    parser.add_argument("--rescan-images", action="store_true", help="Rescan every directory even if --image-index exists")
+    parser.add_argument("--connectivity", help="Per-place Ookla baselines from src/place_connectivity.py to use as wifiSpeed")
+    args = parser.parse_args()
+    image_index = build_image_index(args.image_index, args.rescan_images)
+    connectivity = load_connectivity(args.connectivity) if args.connectivity else None
+    if args.stream:
+        if args.changes:
+            parser.error("--changes cannot be combined with --stream")
+        transform_places_streaming(args.input, args.batch_size, args.ndjson_out, args.parquet_out, image_index, connectivity)
+    else:
+        transform_places(args.changes, image_index, connectivity)
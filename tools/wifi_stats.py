@@ -0,0 +1,215 @@
+import argparse
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_DB_FILE = "website/database.sqlite"
+# Only tests from the last WINDOW_DAYS count towards a shop's statistics.
+DEFAULT_WINDOW_DAYS = 90
+# Half-life of a test's weight in the time-decayed average.
+DEFAULT_HALF_LIFE_DAYS = 14
+# Shop IDs per query when reading the tests of a set of shops.
+LOOKUP_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wifi_speed_stats (
+  coffee_shop_id INTEGER PRIMARY KEY REFERENCES coffee_shops(id),
+  sample_count INTEGER NOT NULL,
+  median_speed REAL,
+  p10_speed REAL,
+  p90_speed REAL,
+  decayed_mean_speed REAL,
+  oldest_tested_at INTEGER,
+  latest_tested_at INTEGER,
+  updated_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_wifi_speed_stats_median ON wifi_speed_stats(median_speed);
+CREATE TABLE IF NOT EXISTS wifi_stats_state (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+"""
+
+def grouped_stats(shop_ids: np.ndarray, speeds: np.ndarray, tested_at: np.ndarray,
+                  now: int, half_life_days: float) -> Dict[str, np.ndarray]:
+    """
+    Per-shop statistics over a flat array of tests, in one vectorized pass.
+
+    Tests are sorted by (shop, speed) once; each shop is then a contiguous
+    run, so percentiles are read straight off the sorted speeds (with linear
+    interpolation, like np.percentile) and sums are per-run bincounts.
+
+    Returns:
+        Dict[str, np.ndarray]: Arrays aligned on the 'shop_id' entry.
+    """
+    if not len(shop_ids):
+        empty = np.zeros(0)
+        return {key: empty for key in ("shop_id", "count", "median", "p10", "p90", "decayed_mean", "oldest", "latest")}
+
+    order = np.lexsort((speeds, shop_ids))
+    shop_ids, speeds, tested_at = shop_ids[order], speeds[order].astype(np.float64), tested_at[order]
+
+    starts = np.flatnonzero(np.r_[True, shop_ids[1:] != shop_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(shop_ids)])
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    def percentile(q: float) -> np.ndarray:
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        return speeds[lower] + (speeds[upper] - speeds[lower]) * (position - lower)
+
+    # Weights halve every half_life_days. Only ratios matter, so the result
+    # doesn't drift as `now` moves on; it changes only when tests arrive or
+    # leave the window.
+    weights = np.exp2(-(now - tested_at) / (half_life_days * 86400))
+    decayed = np.bincount(group, weights=weights * speeds) / np.bincount(group, weights=weights)
+
+    return {
+        "shop_id": shop_ids[starts],
+        "count": counts,
+        "median": percentile(0.5),
+        "p10": percentile(0.1),
+        "p90": percentile(0.9),
+        "decayed_mean": decayed,
+        "oldest": np.minimum.reduceat(tested_at, starts),
+        "latest": np.maximum.reduceat(tested_at, starts),
+    }
+
+def read_tests(conn: sqlite3.Connection, since: int,
+               shop_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read (shop, speed, tested_at) for tests at or after `since`, optionally for some shops only."""
+    sql = "SELECT coffee_shop_id, speed, tested_at FROM wifi_tests WHERE tested_at >= ?"
+    if shop_ids is None:
+        rows = conn.execute(sql, (since,)).fetchall()
+    else:
+        rows = []
+        for i in range(0, len(shop_ids), LOOKUP_CHUNK_SIZE):
+            chunk = shop_ids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(f"{sql} AND coffee_shop_id IN ({placeholders})", [since, *chunk]))
+    data = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+def get_state(conn: sqlite3.Connection, key: str, default: int = 0) -> int:
+    row = conn.execute("SELECT value FROM wifi_stats_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def stale_shops(conn: sqlite3.Connection, watermark: int, cutoff: int) -> List[int]:
+    """
+    Shops whose statistics must be recomputed: those with tests newer than
+    the watermark, and those whose oldest counted test has left the window.
+    """
+    new_tests = conn.execute("SELECT DISTINCT coffee_shop_id FROM wifi_tests WHERE id > ?", (watermark,))
+    expired = conn.execute(
+        "SELECT coffee_shop_id FROM wifi_speed_stats WHERE sample_count > 0 AND oldest_tested_at < ?", (cutoff,)
+    )
+    return sorted({shop_id for (shop_id,) in new_tests} | {shop_id for (shop_id,) in expired})
+
+def write_stats(conn: sqlite3.Connection, shop_ids: Iterable[int], stats: Dict[str, np.ndarray], now: int):
+    """
+    Upsert the statistics of the given shops. Shops without tests in the
+    window get empty stats and their coffee_shops.wifi_speed is cleared,
+    since the window no longer supports any speed.
+    """
+    rows = {
+        int(shop_id): (int(count), median, p10, p90, decayed, int(oldest), int(latest))
+        for shop_id, count, median, p10, p90, decayed, oldest, latest in zip(
+            stats["shop_id"], stats["count"], stats["median"].tolist(), stats["p10"].tolist(),
+            stats["p90"].tolist(), stats["decayed_mean"].tolist(), stats["oldest"], stats["latest"],
+        )
+    }
+    empty = (0, None, None, None, None, None, None)
+    conn.executemany(
+        """
+        INSERT INTO wifi_speed_stats (
+            coffee_shop_id, sample_count, median_speed, p10_speed, p90_speed,
+            decayed_mean_speed, oldest_tested_at, latest_tested_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(coffee_shop_id) DO UPDATE SET
+            sample_count = excluded.sample_count,
+            median_speed = excluded.median_speed,
+            p10_speed = excluded.p10_speed,
+            p90_speed = excluded.p90_speed,
+            decayed_mean_speed = excluded.decayed_mean_speed,
+            oldest_tested_at = excluded.oldest_tested_at,
+            latest_tested_at = excluded.latest_tested_at,
+            updated_at = excluded.updated_at
+        """,
+        [(shop_id, *rows.get(shop_id, empty), now) for shop_id in shop_ids],
+    )
+    # coffee_shops.wifi_speed is what listings show and filter on; keep it at
+    # the rolling median, or NULL once a shop's tests have all expired.
+    conn.executemany(
+        "UPDATE coffee_shops SET wifi_speed = ?, updated_at = ? WHERE id = ?",
+        [(round(rows[shop_id][1]) if shop_id in rows else None, now, shop_id) for shop_id in shop_ids],
+    )
+
+def refresh_wifi_stats(db_file: str = DEFAULT_DB_FILE, window_days: int = DEFAULT_WINDOW_DAYS,
+                       half_life_days: float = DEFAULT_HALF_LIFE_DAYS, now: Optional[int] = None,
+                       rebuild: bool = False) -> int:
+    """
+    Recompute rolling WiFi statistics for the shops that need it.
+
+    Returns:
+        int: The number of shops whose statistics were rewritten.
+    """
+    start = time.perf_counter()
+    now = int(time.time()) if now is None else now
+    cutoff = now - window_days * 86400
+    # The journal mode is left as is: it persists in the website's database,
+    # and each refresh is one short transaction.
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    conn.executescript(SCHEMA)
+
+    try:
+        conn.execute("BEGIN")
+        # Tests added while this run is in progress are picked up next time.
+        high_water = conn.execute("SELECT COALESCE(MAX(id), 0) FROM wifi_tests").fetchone()[0]
+        if rebuild:
+            conn.execute("DELETE FROM wifi_speed_stats")
+            # Every shop that was ever tested, so those whose tests have all
+            # expired get an empty row (and a cleared wifi_speed) too.
+            shop_ids = [shop_id for (shop_id,) in conn.execute(
+                "SELECT DISTINCT coffee_shop_id FROM wifi_tests ORDER BY coffee_shop_id"
+            )]
+            tests = read_tests(conn, cutoff)
+        else:
+            shop_ids = stale_shops(conn, get_state(conn, "watermark"), cutoff)
+            tests = read_tests(conn, cutoff, shop_ids) if shop_ids else None
+
+        if shop_ids:
+            stats = grouped_stats(*tests, now, half_life_days)
+            write_stats(conn, shop_ids, stats, now)
+        conn.execute(
+            "INSERT OR REPLACE INTO wifi_stats_state (key, value) VALUES ('watermark', ?)", (high_water,)
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    print(f"Updated WiFi stats for {len(shop_ids)} shops in {time.perf_counter() - start:.2f}s")
+    return len(shop_ids)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain rolling per-shop WiFi speed statistics from wifi_tests.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="SQLite database containing wifi_tests")
+    parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS, help="Rolling window length")
+    parser.add_argument("--half-life-days", type=float, default=DEFAULT_HALF_LIFE_DAYS,
+                        help="Half-life of a test's weight in the decayed average")
+    parser.add_argument("--now", type=int, help="Evaluate as of this unix timestamp (defaults to the current time)")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every shop, not just those with changes")
+    parser.add_argument("--every", type=float, metavar="MINUTES",
+                        help="Keep running, refreshing every MINUTES (otherwise run once, e.g. from cron)")
+    args = parser.parse_args()
+
+    refresh_wifi_stats(args.db, args.window_days, args.half_life_days, args.now, args.rebuild)
+    while args.every:
+        time.sleep(args.every * 60)
+        refresh_wifi_stats(args.db, args.window_days, args.half_life_days, args.now)